@@ -1,25 +1,56 @@
+import hashlib
 import json
-from json import JSONDecodeError
-from typing import Any
+from collections import defaultdict
+from typing import Any, Optional
 
 from django.apps import apps
-from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import translation
+from django.utils.html import escape
 from django.utils.translation import gettext_lazy as _
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
-from .. import blocks
+from .. import blocks, jsoncodec
+from ..local_cache import local_cache
 from ..logging import logger
 from ..typing import BlockInstance, BlockModel
+from .base import StreamBlockModelAdminMixin
+
+
+# Placeholder for the field ID in the cached markup of the buttons.
+FIELD_ID_PLACEHOLDER = "__streamfield_field_id__"
+BUTTONS_CACHE_TTL = 300
 
 
 class Http400(Exception):
     pass
 
 
+def json_response(data) -> HttpResponse:
+    """
+    Like `JsonResponse`, but the data is encoded with the configured JSON codec.
+    Non-ASCII characters are not escaped, so the body is always UTF-8.
+    """
+    return HttpResponse(jsoncodec.dumps_bytes(data), content_type="application/json; charset=utf-8")
+
+
+def is_model_list(value) -> bool:
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def is_overridden(model_admin, method_name: str) -> bool:
+    """
+    Check whether the ModelAdmin overrides the given method
+    of the base `ModelAdmin` class.
+    """
+    return getattr(type(model_admin), method_name) is not getattr(admin.ModelAdmin, method_name)
+
+
 class AdminStreamViewMixin:
     admin_site = None
 
@@ -34,8 +65,8 @@ class AdminStreamViewMixin:
 
     def parse_request_json(self):
         try:
-            return json.loads(self.request.body)
-        except JSONDecodeError:
+            return jsoncodec.loads(self.request.body)
+        except ValueError:
             raise Http400(_("The request body is not valid JSON"))
 
     def get_model_admin(self, model: BlockModel):
@@ -48,6 +79,10 @@ class AdminStreamViewMixin:
 
 
 class RenderStreamView(AdminStreamViewMixin, View):
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self._permissions = {}  # type: dict[BlockModel, tuple[bool, bool]]
+
     def post(self, request):
         data = self.parse_request_json()
 
@@ -60,48 +95,154 @@ class RenderStreamView(AdminStreamViewMixin, View):
         if not isinstance(stream, list):
             raise Http400(_("Invalid stream type"))
 
-        return JsonResponse({
-            "blocks": "".join(
-                self.render_block(record, allowed_models)
-                for record in stream
-            )
+        stream = self.get_window(stream, data)
+        output = self.render_blocks(stream, allowed_models)
+        if data.get("fragments"):
+            # Incremental update: the HTML of each record, keyed by UUID.
+            return json_response({
+                "fragments": {
+                    record.get("uuid", "") if isinstance(record, dict) else "": html
+                    for record, html in zip(stream, output)
+                }
+            })
+
+        return json_response({
+            "blocks": "".join(output)
         })
 
-    def render_block(self, record: dict[str, Any], allowed_models: list[str]) -> str:
+    def get_window(self, stream: list, data: dict[str, Any]) -> list:
+        """
+        Get the records in the window defined by the optional
+        `offset` and `limit` parameters of the request data.
+        """
+        offset = data.get("offset", 0)
+        limit = data.get("limit")
+
+        if not isinstance(offset, int) or offset < 0:
+            raise Http400(_("Invalid request data"))
+
+        if limit is None:
+            return stream[offset:]
+
+        if not isinstance(limit, int) or limit < 0:
+            raise Http400(_("Invalid request data"))
+
+        return stream[offset:offset + limit]
+
+    def render_blocks(self, stream: list, allowed_models: list[str]) -> list[str]:
+        """
+        Render the admin representation of the stream records.
+        Block instances are fetched with a single query per model.
+        """
+        return self.render_streams([(stream, allowed_models)])[0]
+
+    def render_streams(self, streams: list[tuple[list, list[str]]]) -> list[list[str]]:
+        """
+        Render the records of several streams, each with its own list
+        of allowed models. Block instances of all streams are fetched
+        with a single query per model.
+        """
+        # Phase 1: Validate the records and collect block identifiers.
+        parsed_streams = []  # type: list[list[tuple[Any, Optional[BlockModel], Any, Optional[str]]]]
+        pending_ids = defaultdict(set)
+        for stream, allowed_models in streams:
+            records = []
+            for record in stream:
+                model, pk, reason = self.parse_record(record, allowed_models)
+                if reason is None:
+                    pending_ids[model].add(pk)
+                records.append((record, model, pk, reason))
+            parsed_streams.append(records)
+
+        # Phase 2: Fetch the blocks.
+        instances = {
+            model: blocks.get_processor(model).get_queryset().in_bulk(ids)
+            for model, ids in pending_ids.items()
+        }
+
+        # Phase 3: Render each record.
+        outputs = []
+        for records in parsed_streams:
+            output = []
+            for record, model, pk, reason in records:
+                if reason is not None:
+                    output.append(self.block_invalid(record, reason))
+                    continue
+
+                block = instances[model].get(pk)
+                if block is None:
+                    output.append(self.block_invalid(record, _("Instance not found")))
+                else:
+                    output.append(self.block_valid(record, block))
+            outputs.append(output)
+
+        return outputs
+
+    def parse_record(self, record: Any, allowed_models: list[str]) -> tuple[Optional[BlockModel], Any, Optional[str]]:
+        """
+        Returns a tuple of the block model, the primary key of the block
+        and the reason why the record is invalid, if any.
+        """
         if not blocks.is_valid(record):
-            return self.block_invalid(record, _("Invalid data format"))
+            return None, None, _("Invalid data format")
 
         if record["model"] not in allowed_models:
-            return self.block_invalid(record, _("The specified class is not allowed here"))
+            return None, None, _("The specified class is not allowed here")
 
         try:
             model = blocks.get_model(record)
         except LookupError:
-            return self.block_invalid(record, _("Model not found"))
-
-        processor = blocks.get_processor(model)
-        queryset = processor.get_queryset()
-        pk = model._meta.pk.get_prep_value(record["pk"])
+            return None, None, _("Model not found")
 
         try:
-            block = queryset.get(pk=pk)
-        except ObjectDoesNotExist:
-            return self.block_invalid(record, _("Instance not found"))
-        except MultipleObjectsReturned:
-            return self.block_invalid(record, _("Multiple objects returned"))
-        else:
-            return self.block_valid(record, block)
+            pk = model._meta.pk.to_python(record["pk"])
+        except ValidationError:
+            return model, None, _("Instance not found")
+
+        return model, pk, None
+
+    def get_permissions(self, block: BlockInstance) -> tuple[bool, bool]:
+        """
+        Returns a tuple of change and view permissions for the block.
+
+        Permissions are checked once per model, unless the ModelAdmin
+        overrides the permission methods, which may depend on the object.
+        """
+        model = type(block)
+        model_admin = self.get_model_admin(model)
+        if model_admin is None:
+            return False, False
+
+        if model in self._permissions:
+            return self._permissions[model]
+
+        object_level = (
+            is_overridden(model_admin, "has_change_permission")
+            or is_overridden(model_admin, "has_view_permission")
+        )
+        if object_level:
+            return (
+                model_admin.has_change_permission(self.request, block),
+                model_admin.has_view_permission(self.request, block),
+            )
+
+        self._permissions[model] = (
+            model_admin.has_change_permission(self.request),
+            model_admin.has_view_permission(self.request),
+        )
+        return self._permissions[model]
 
     def block_valid(self, record: dict[str, Any], block: BlockInstance) -> str:
         model_admin = self.get_model_admin(type(block))
-        template = getattr(model_admin, "stream_block_template")
+        template = getattr(model_admin, "stream_block_template", StreamBlockModelAdminMixin.stream_block_template)
+        has_change_permission, has_view_permission = self.get_permissions(block)
         return render_to_string(template, {
             "uuid": record["uuid"],
             "instance": block,
             "opts": block._meta,
             "visible": record.get("visible", True),
-            "has_change_permission": model_admin.has_change_permission(self.request, block) if model_admin is not None else False,
-            "has_view_permission": model_admin.has_view_permission(self.request, block) if model_admin is not None else False,
+            "has_change_permission": has_change_permission,
+            "has_view_permission": has_view_permission,
         }, request=self.request)
 
     def block_invalid(self, record: dict[str, Any], reason: str) -> str:
@@ -114,31 +255,63 @@ class RenderStreamView(AdminStreamViewMixin, View):
         }, request=self.request)
 
 
-class RenderButtonsView(AdminStreamViewMixin, View):
-    def post(self, request):
-        data = self.parse_request_json()
+class RenderButtonsMixin:
+    def render_buttons(self, field_id: str, allowed_models: list[str]) -> str:
+        """
+        Render the buttons for creating and looking up blocks.
 
-        try:
-            allowed_models = data["allowedModels"]
-            field_id = data["field_id"]
-        except KeyError:
-            raise Http400(_("Invalid request data"))
+        The markup is cached for each combination of user permissions
+        and allowed models, unless a ModelAdmin overrides the permission
+        methods. The field ID is substituted into the cached markup.
+        """
+        models = []
+        for model_name in allowed_models:
+            try:
+                models.append(apps.get_model(model_name))
+            except LookupError:
+                continue
 
-        if not isinstance(allowed_models, list):
-            raise Http400(_("Invalid request data"))
+        cache_key = self.get_buttons_cache_key(models)
+        markup = local_cache.get(cache_key) if cache_key else None
+        if markup is None:
+            markup = self.render_buttons_markup(models)
+            if cache_key:
+                local_cache.set(cache_key, markup, BUTTONS_CACHE_TTL)
 
-        if not all(isinstance(item, str) for item in allowed_models):
-            raise Http400(_("Invalid request data"))
+        return markup.replace(FIELD_ID_PLACEHOLDER, escape(field_id))
 
+    def get_buttons_cache_key(self, models: list[BlockModel]) -> Optional[str]:
+        for model in models:
+            model_admin = self.get_model_admin(model)
+            if model_admin is not None and any(
+                is_overridden(model_admin, method_name)
+                for method_name in ("has_add_permission", "has_change_permission", "has_view_permission")
+            ):
+                return None
+
+        user = self.request.user
+        if user.is_active and user.is_superuser:
+            # Active superusers have all permissions.
+            permissions = None
+        else:
+            permissions = sorted(user.get_all_permissions())
+
+        key_data = [
+            user.is_active,
+            user.is_superuser,
+            permissions,
+            [model._meta.label_lower for model in models],
+            translation.get_language(),
+        ]
+        return "streamfield:buttons:{}".format(
+            hashlib.md5(json.dumps(key_data).encode()).hexdigest()
+        )
+
+    def render_buttons_markup(self, models: list[BlockModel]) -> str:
         creatable_models = []
         searchable_models = []
 
-        for model_name in allowed_models:
-            try:
-                model = apps.get_model(model_name)  # type: BlockModel
-            except LookupError:
-                continue
-
+        for model in models:
             model_admin = self.get_model_admin(model)
             if model_admin is None:
                 continue
@@ -150,7 +323,7 @@ class RenderButtonsView(AdminStreamViewMixin, View):
 
             if has_add_permission:
                 creatable_models.append({
-                    "id": "streamfield:add_%s--%s.%s" % (field_id, info[0], info[1]),
+                    "id": "streamfield:add_%s--%s.%s" % (FIELD_ID_PLACEHOLDER, info[0], info[1]),
                     "title": model._meta.verbose_name,
                     "url": reverse("admin:%s_%s_add" % info),
                     "action": "create",
@@ -158,15 +331,70 @@ class RenderButtonsView(AdminStreamViewMixin, View):
 
             if has_change_permission or has_view_permission:
                 searchable_models.append({
-                    "id": "streamfield:lookup_%s--%s.%s" % (field_id, info[0], info[1]),
+                    "id": "streamfield:lookup_%s--%s.%s" % (FIELD_ID_PLACEHOLDER, info[0], info[1]),
                     "title": model._meta.verbose_name_plural,
                     "url": reverse("admin:%s_%s_changelist" % info),
                     "action": "lookup",
                 })
 
-        return JsonResponse({
-            "buttons": render_to_string("streamfield/admin/buttons.html", {
-                "creatable_models": creatable_models,
-                "searchable_models": searchable_models,
-            }, request=self.request)
+        return render_to_string("streamfield/admin/buttons.html", {
+            "creatable_models": creatable_models,
+            "searchable_models": searchable_models,
+        }, request=self.request)
+
+
+class RenderButtonsView(RenderButtonsMixin, AdminStreamViewMixin, View):
+    def post(self, request):
+        data = self.parse_request_json()
+
+        try:
+            allowed_models = data["allowedModels"]
+            field_id = data["field_id"]
+        except KeyError:
+            raise Http400(_("Invalid request data"))
+
+        if not is_model_list(allowed_models):
+            raise Http400(_("Invalid request data"))
+
+        return json_response({
+            "buttons": self.render_buttons(field_id, allowed_models)
+        })
+
+
+class BootstrapView(RenderButtonsMixin, RenderStreamView):
+    """
+    Render the blocks and the buttons of all StreamFields
+    of a form with a single request.
+    """
+
+    def post(self, request):
+        data = self.parse_request_json()
+
+        fields = data.get("fields") if isinstance(data, dict) else None
+        if not isinstance(fields, list):
+            raise Http400(_("Invalid request data"))
+
+        for field in fields:
+            if not isinstance(field, dict):
+                raise Http400(_("Invalid request data"))
+
+            if not isinstance(field.get("field_id"), str) or not is_model_list(field.get("allowedModels")):
+                raise Http400(_("Invalid request data"))
+
+            if not isinstance(field.get("value"), list):
+                raise Http400(_("Invalid stream type"))
+
+        outputs = self.render_streams([
+            (self.get_window(field["value"], field), field["allowedModels"])
+            for field in fields
+        ])
+
+        return json_response({
+            "fields": {
+                field["field_id"]: {
+                    "blocks": "".join(output),
+                    "buttons": self.render_buttons(field["field_id"], field["allowedModels"]),
+                }
+                for field, output in zip(fields, outputs)
+            }
         })
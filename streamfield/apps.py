@@ -1,7 +1,29 @@
 from django.apps import AppConfig
+from django.core.signals import request_started, setting_changed
+from django.utils.autoreload import file_changed
 from django.utils.translation import gettext_lazy as _
 
+from .conf import PRELOAD_TEMPLATES
+
 
 class Config(AppConfig):
     name = "streamfield"
     verbose_name = _("Streamfield")
+
+    def ready(self):
+        from . import blocks, checks, signals
+
+        block_models = blocks.get_block_models()
+        blocks.register_processors(block_models)
+
+        for model in block_models:
+            signals.connect_signals(model)
+
+        file_changed.connect(signals.handle_file_changed, dispatch_uid="streamfield:file_changed")
+        setting_changed.connect(signals.handle_setting_changed, dispatch_uid="streamfield:setting_changed")
+
+        # Templates are compiled on the first request rather than here,
+        # since template engines may load the template tags of the apps
+        # that are not ready yet.
+        if PRELOAD_TEMPLATES:
+            request_started.connect(signals.preload_templates, dispatch_uid="streamfield:preload_templates")
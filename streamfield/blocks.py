@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 from uuid import uuid4
 
 from django.apps import apps
@@ -5,6 +6,7 @@ from django.core.exceptions import ImproperlyConfigured
 from django.utils.module_loading import import_string
 
 from .conf import DEFAULT_PROCESSOR
+from .logging import logger
 from .processors import BaseProcessor
 from .typing import BlockInstance, BlockModel
 
@@ -52,9 +54,47 @@ def get_model(value: dict[str, str]) -> BlockModel:
     return apps.get_model(value["model"])
 
 
-def get_processor(model: BlockModel) -> BaseProcessor:
+def get_block_models() -> set[BlockModel]:
     """
-    Возвращает экземпляр обработчика для указанной модели.
+    Возвращает модели блоков проекта: модели, разрешённые
+    в любом `StreamField`, и модели с классом `StreamBlockMeta`.
+    """
+    from .field.models import StreamField
+
+    block_models = set()
+    for model in apps.get_models():
+        if hasattr(model, "StreamBlockMeta"):
+            block_models.add(model)
+
+        for field in model._meta.get_fields():
+            if isinstance(field, StreamField):
+                block_models.update(
+                    apps.get_model(block_model) if isinstance(block_model, str) else block_model
+                    for block_model in field.models
+                )
+    return block_models
+
+
+def get_stream_fields(model: BlockModel) -> list:
+    """
+    Возвращает поля `StreamField` модели блока.
+    Используется для рендеринга вложенных потоков.
+    """
+    fields = _stream_fields.get(model)
+    if fields is None:
+        from .field.models import StreamField
+
+        fields = _stream_fields[model] = [
+            field
+            for field in model._meta.concrete_fields
+            if isinstance(field, StreamField)
+        ]
+    return fields
+
+
+def create_processor(model: BlockModel) -> BaseProcessor:
+    """
+    Создаёт экземпляр обработчика для указанной модели.
     """
     stream_meta = getattr(model, "StreamBlockMeta", None)
     if stream_meta is not None:
@@ -73,3 +113,53 @@ def get_processor(model: BlockModel) -> BaseProcessor:
         model_name=model.__name__,
         **(stream_meta.__dict__ if stream_meta is not None else {})
     )
+
+
+def get_processor(model: BlockModel) -> BaseProcessor:
+    """
+    Возвращает экземпляр обработчика для указанной модели.
+
+    Обработчики не хранят состояние между вызовами, поэтому
+    экземпляр создаётся один раз для каждой модели.
+    """
+    processor = _processors.get(model)
+    if processor is None:
+        processor = _processors[model] = create_processor(model)
+    return processor
+
+
+def register_processors(models: Iterable[BlockModel]):
+    """
+    Создаёт обработчики для указанных моделей заранее.
+    Ошибки конфигурации пропускаются: о них сообщают системные проверки.
+    """
+    for model in models:
+        try:
+            get_processor(model)
+        except (ImproperlyConfigured, ImportError, LookupError):
+            pass
+
+
+def preload_templates(models: Iterable[BlockModel]):
+    """
+    Компилирует шаблоны указанных моделей блоков заранее.
+    Пропускает обработчики, шаблоны которых зависят от экземпляра блока.
+    """
+    for model in models:
+        try:
+            processor = get_processor(model)
+            if hasattr(processor, "get_template"):
+                processor.get_template(None)
+        except Exception:
+            logger.debug("Unable to preload the template of %s", model._meta.label)
+
+
+def clear_processors():
+    """
+    Очищает реестр обработчиков.
+    """
+    _processors.clear()
+
+
+_processors = {}  # type: dict[BlockModel, BaseProcessor]
+_stream_fields = {}  # type: dict[BlockModel, list]
@@ -0,0 +1,53 @@
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateDoesNotExist
+from django.template.loader import select_template
+
+from . import blocks
+
+
+@checks.register(checks.Tags.templates)
+def check_block_processors(app_configs=None, **kwargs):
+    """
+    Checks that the processors of all block models can be created
+    and that the default templates of the blocks exist.
+    """
+    errors = []
+    for model in sorted(blocks.get_block_models(), key=lambda m: m._meta.label):
+        if app_configs is not None and model._meta.app_config not in app_configs:
+            continue
+
+        try:
+            processor = blocks.create_processor(model)
+        except (ImproperlyConfigured, ImportError, LookupError) as exc:
+            errors.append(
+                checks.Error(
+                    "Invalid StreamBlock processor: %s" % exc,
+                    obj=model,
+                    id="streamfield.E001",
+                )
+            )
+            continue
+
+        try:
+            template_names = processor.get_template_names(None)
+        except Exception:
+            # Template names depend on the block instance.
+            continue
+
+        if isinstance(template_names, str):
+            template_names = [template_names]
+
+        try:
+            select_template(template_names, using=getattr(processor, "template_engine", None))
+        except TemplateDoesNotExist:
+            errors.append(
+                checks.Warning(
+                    "Block template not found: %s" % ", ".join(template_names),
+                    hint="Create one of the templates or specify `template_name` in StreamBlockMeta.",
+                    obj=model,
+                    id="streamfield.W001",
+                )
+            )
+
+    return errors
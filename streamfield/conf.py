@@ -2,3 +2,6 @@ from django.conf import settings
 
 DEFAULT_TEMPLATE_ENGINE = getattr(settings, "PAPER_STREAMFIELD_DEFAULT_TEMPLATE_ENGINE", None)
 DEFAULT_PROCESSOR = getattr(settings, "PAPER_STREAMFIELD_DEFAULT_PROCESSOR", "streamfield.processors.DefaultProcessor")
+LOCAL_CACHE_MAX_SIZE = getattr(settings, "PAPER_STREAMFIELD_LOCAL_CACHE_MAX_SIZE", 32 * 1024 * 1024)
+PRELOAD_TEMPLATES = getattr(settings, "PAPER_STREAMFIELD_PRELOAD_TEMPLATES", True)
+JSON_CODEC = getattr(settings, "PAPER_STREAMFIELD_JSON_CODEC", "auto")
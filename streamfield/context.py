@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+
+from django.template.context import BaseContext, Context
+
+
+class BlockContext(Context):
+    """
+    Template context shared by all blocks of a stream.
+
+    The parent context is stored once, and the context of each block
+    is pushed on top of it for the duration of the render, so the parent
+    context is never copied. Unlike `RequestContext`, the context
+    processors run once per template engine rather than once per block.
+    """
+
+    def __init__(self, dict_=None, request=None, autoescape=True):
+        super().__init__(autoescape=autoescape)
+        self.request = request
+        self._processors_index = len(self.dicts)
+        self._processors_output = {}
+
+        # placeholder for context processors output
+        self.update({})
+
+        # the parent context, so that context processors don't overwrite it
+        self.update(dict_ or {})
+
+    @contextmanager
+    def bind_template(self, template):
+        if self.template is not None:
+            raise RuntimeError("Context is already bound to a template")
+
+        self.template = template
+        self.autoescape = template.engine.autoescape
+        if self.request is not None and hasattr(self, "_processors_index"):
+            self.dicts[self._processors_index] = self.get_processors_output(template.engine)
+
+        try:
+            yield
+        finally:
+            self.template = None
+            if hasattr(self, "_processors_index"):
+                self.dicts[self._processors_index] = {}
+
+    def get_processors_output(self, engine):
+        """
+        Get the merged output of the context processors of the engine.
+
+        :type engine: django.template.Engine
+        :rtype: dict
+        """
+        updates = self._processors_output.get(engine)
+        if updates is None:
+            updates = {}
+            for processor in engine.template_context_processors:
+                context = processor(self.request)
+                try:
+                    updates.update(context)
+                except TypeError as e:
+                    raise TypeError(
+                        f"Context processor {processor.__qualname__} didn't return a "
+                        "dictionary."
+                    ) from e
+            self._processors_output[engine] = updates
+        return updates
+
+    def new(self, values=None):
+        new_context = super().new(values)
+        # Contexts created via Context.new don't include
+        # values from context processors.
+        if hasattr(new_context, "_processors_index"):
+            del new_context._processors_index
+        return new_context
+
+    def keys(self):
+        return self.flatten().keys()
+
+    def items(self):
+        return self.flatten().items()
+
+
+def flatten_context(context):
+    """
+    Convert a template context into a plain dictionary.
+
+    :type context: TemplateContext|BaseContext|None
+    :rtype: TemplateContext
+    """
+    if context is None:
+        return {}
+    if isinstance(context, BaseContext):
+        return context.flatten()
+    return context
@@ -1,12 +1,11 @@
-import json
-
 from django.apps import apps
 from django.core.exceptions import ValidationError
 from django.db.models import Model
 from django.forms import JSONField
+from django.forms.fields import InvalidJSONInput, JSONString
 from django.utils.translation import gettext_lazy as _
 
-from .. import blocks
+from .. import blocks, jsoncodec
 from .widgets import StreamWidget
 
 
@@ -20,6 +19,39 @@ class StreamField(JSONField):
         self.models = kwargs.pop("models", [])
         super().__init__(**kwargs)
 
+    def to_python(self, value):
+        if self.decoder is not None or self.disabled or not isinstance(value, str) or isinstance(value, JSONString):
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+
+        try:
+            converted = jsoncodec.loads(value)
+        except ValueError:
+            raise ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+
+        if isinstance(converted, str):
+            return JSONString(converted)
+        return converted
+
+    def bound_data(self, data, initial):
+        if self.decoder is not None or self.disabled or data is None:
+            return super().bound_data(data, initial)
+
+        try:
+            return jsoncodec.loads(data)
+        except ValueError:
+            return InvalidJSONInput(data)
+
+    def prepare_value(self, value):
+        if self.encoder is not None or isinstance(value, InvalidJSONInput):
+            return super().prepare_value(value)
+        return jsoncodec.dumps(value)
+
     def validate(self, value):
         super().validate(value)
 
@@ -47,4 +79,4 @@ class StreamField(JSONField):
             opts = model._meta
             allowed_models.append(f"{opts.app_label}.{opts.model_name}")
 
-        return json.dumps(allowed_models)
+        return jsoncodec.dumps(allowed_models)
@@ -1,5 +1,8 @@
 from django.db.models import NOT_PROVIDED, JSONField
+from django.db.models.fields.json import KeyTransform
 
+from .. import jsoncodec
+from ..stream import Stream
 from . import forms
 
 
@@ -22,6 +25,19 @@ class StreamField(JSONField):
             del kwargs["blank"]
         return name, path, args, kwargs
 
+    def from_db_value(self, value, expression, connection):
+        if self.decoder is not None or isinstance(expression, KeyTransform):
+            value = super().from_db_value(value, expression, connection)
+        elif isinstance(value, (str, bytes)):
+            try:
+                value = jsoncodec.loads(value)
+            except ValueError:
+                return value
+
+        if isinstance(value, list):
+            return Stream(value)
+        return value
+
     def formfield(self, **kwargs):
         return super().formfield(
             **{
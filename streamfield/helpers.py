@@ -1,26 +1,21 @@
+import hashlib
 import json
-from collections import defaultdict
-from typing import Union
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Union
 
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import models
 
-from . import blocks, exceptions
+from . import blocks, exceptions, jsoncodec
 from .logging import logger
-from .processors import BaseProcessor
-from .typing import BlockInstance, TemplateContext
-
-
-def get_block_output(
-    processor: BaseProcessor,
-    block: BlockInstance,
-    context: TemplateContext,
-    request: WSGIRequest = None
-):
-    try:
-        return processor.render(block, context, request=request)
-    except exceptions.SkipBlock:
-        return ""
+from .processors import get_vary_key
+from .renderer import StreamRenderer, get_block_output, parse_stream
+from .store import get_current_store
+from .typing import BlockInstance, BlockModel, TemplateContext
 
 
 def render_stream(
@@ -35,59 +30,233 @@ def render_stream(
     and renders them into a single HTML string. You can provide
     an optional context to include additional data in the rendering process.
     """
+    renderer = StreamRenderer(context, request)
+
+    # Phase 1: Filter out invisible blocks, look up cached blocks.
+    records = parse_stream(stream)
+    renderer.add(records)
+
+    # Phase 2: Fetch the data for non-cached blocks.
+    renderer.fetch()
+
+    # Phase 3: Render each block.
+    return renderer.render(records)
+
+
+def iter_render_stream(
+    stream: Union[str, list],
+    context: TemplateContext = None,
+    request: WSGIRequest = None,
+    lazy: bool = False
+) -> Iterator[str]:
+    """
+    Generator version of `render_stream()` that yields the HTML
+    of each block as soon as it is rendered.
+
+    Suitable for `StreamingHttpResponse`. With `lazy=True`, each block
+    model is queried right before its first block is rendered,
+    so the leading blocks are sent before the rest of the models are fetched.
+    """
+    renderer = StreamRenderer(context, request)
+    records = parse_stream(stream)
+    renderer.add(records)
+
+    if not lazy:
+        renderer.fetch()
+
+    yield from renderer.iter_render(records)
+
+
+async def arender_stream(
+    stream: Union[str, list],
+    context: TemplateContext = None,
+    request: WSGIRequest = None
+) -> str:
+    """
+    Asynchronous version of `render_stream()`.
+
+    Django runs the database queries of a request in a single thread,
+    so the block models are fetched one after another, just like
+    in `render_stream()`. The whole stream is rendered in that thread
+    with a single switch from the event loop, since templates
+    and processors may access the database synchronously.
+    """
+    return await sync_to_async(render_stream)(stream, context, request)
+
+
+def render_streams(
+    streams: Iterable[Union[str, list]],
+    context: TemplateContext = None,
+    request: WSGIRequest = None
+) -> list[str]:
+    """
+    Render several streams at once.
+
+    Block identifiers are merged across all streams, so each block model
+    is queried only once regardless of the number of streams.
+    Returns a list of HTML strings in the order of the given streams.
+    """
+    renderer = StreamRenderer(context, request)
+
+    # Phase 1: Parse every stream, look up cached blocks of all streams.
+    parsed_streams = [parse_stream(stream) for stream in streams]
+    renderer.add(record for records in parsed_streams for record in records)
+
+    # Phase 2: Fetch the data for non-cached blocks of all streams.
+    renderer.fetch()
+
+    # Phase 3: Render each stream from the shared instance map.
+    return [
+        renderer.render(records)
+        for records in parsed_streams
+    ]
+
+
+def render_blocks(
+    items: Iterable[Union[BlockInstance, tuple[Union[BlockModel, str], Any]]],
+    context: TemplateContext = None,
+    request: WSGIRequest = None
+) -> list[str]:
+    """
+    Render a sequence of blocks given either as model instances
+    or as `(model, pk)` references, where `model` is a model class
+    or a model label.
+
+    References are fetched with a single query per model, cached blocks
+    are looked up at once. Returns a list of HTML strings in the order
+    of the given items; invalid, missing and skipped blocks produce
+    empty strings.
+    """
+    renderer = StreamRenderer(context, request)
+
+    records = []
+    instances = []
+    for item in items:
+        if isinstance(item, models.Model):
+            model, pk = type(item), item.pk
+            instances.append(item)
+        else:
+            model, pk = item
+            if isinstance(model, str):
+                try:
+                    model = apps.get_model(model)
+                except (LookupError, ValueError):
+                    logger.warning("Invalid block: %r", item)
+                    records.append(None)
+                    continue
+        records.append(({"model": model._meta.label_lower, "pk": pk}, model))
+
+    valid_records = [record for record in records if record is not None]
+    renderer.add_instances(instances)
+    renderer.add(valid_records)
+    renderer.fetch()
+
+    outputs = iter(renderer.render_each(valid_records))
+    return [
+        "" if record is None else next(outputs)
+        for record in records
+    ]
+
+
+def get_stream_cache_key(
+    stream: Union[str, list],
+    vary_on: Iterable[str] = (),
+    context: TemplateContext = None,
+    request: WSGIRequest = None
+) -> str:
+    """
+    Build a cache key for the output of the whole stream from
+    the visible records of the stream and the `vary_on` values.
+    """
     if isinstance(stream, str):
-        stream = json.loads(stream)
+        stream = jsoncodec.loads(stream)
 
     if not isinstance(stream, list):
         raise exceptions.InvalidStreamTypeError(stream)
 
-    # Phase 1: Filter out invisible blocks, fill `per_model_ids` map.
-    per_model_ids = defaultdict(list)
-    filtered_stream = []
-    for record in stream:
-        if not blocks.is_valid(record):
-            raise exceptions.InvalidStreamBlockError(record)
+    normalized = [
+        [record.get("model"), record.get("pk")]
+        for record in stream
+        if isinstance(record, dict) and record.get("visible", True)
+    ]
+    stream_hash = hashlib.md5(json.dumps(normalized).encode()).hexdigest()
+    vary_key = get_vary_key(vary_on, context, request)
+    if vary_key:
+        return "streamfield:stream:{}:{}".format(stream_hash, vary_key)
+    return "streamfield:stream:{}".format(stream_hash)
 
-        visible = record.get("visible", True)
-        if not visible:
-            continue
 
+def render_cached_stream(
+    stream: Union[str, list],
+    context: TemplateContext = None,
+    request: WSGIRequest = None,
+    vary_on: Iterable[str] = (),
+    cache_alias: str = DEFAULT_CACHE_ALIAS,
+    cache_ttl: Optional[int] = 3600
+) -> str:
+    """
+    Render the stream and cache the output of the whole stream.
+
+    The cached output is stored along with the cache generations
+    of the block models referenced by the stream, including the models
+    of nested streams. Saving or deleting a block of any of these models
+    invalidates the output.
+    A cache hit skips the validation, fetching and rendering of blocks.
+    """
+    cache = caches[cache_alias]
+    cache_key = get_stream_cache_key(stream, vary_on, context, request)
+
+    entry = cache.get(cache_key)
+    if entry is not None:
+        model_labels, generations, content = entry
         try:
-            model = blocks.get_model(record)
+            block_models = [apps.get_model(label) for label in model_labels]
         except LookupError:
-            logger.warning("Invalid block: %r", record)
-            continue
-
-        per_model_ids[model].append(record["pk"])
-        filtered_stream.append(record)
+            pass
+        else:
+            renderer = StreamRenderer(context, request)
+            if list(renderer.load_generations(block_models).values()) == generations:
+                return content
 
-    # Phase 2: Fetch the data for blocks.
-    model_processors = {}
-    per_model_blocks = {}
-    for model, ids in per_model_ids.items():
-        processor = blocks.get_processor(model)
-        model_processors[model] = processor
+    renderer = StreamRenderer(context, request, track_generations=True)
+    records = parse_stream(stream)
+    renderer.add(records)
+    renderer.fetch()
+    content = renderer.render(records)
 
-        queryset = processor.get_queryset()
-        per_model_blocks[model] = queryset.in_bulk(ids)
+    # The generations are loaded before the blocks of each model are fetched.
+    entry = (
+        [model._meta.label_lower for model in renderer.generations],
+        list(renderer.generations.values()),
+        content
+    )
+    if cache_ttl is None:
+        cache.set(cache_key, entry)
+    else:
+        cache.set(cache_key, entry, cache_ttl)
 
-    # Phase 3: Render each block.
-    output = []
-    for record in filtered_stream:
-        model = blocks.get_model(record)
+    return content
 
-        pk = model._meta.pk.get_prep_value(record["pk"])
-        block_instance = per_model_blocks[model].get(pk)
-        if block_instance is None:
-            logger.warning("Block does not exist: %r", record)
-            continue
 
-        processor = model_processors[model]
-        block_output = get_block_output(processor, block_instance, context, request)
-        if block_output:
-            output.append(block_output)
+def render_object_streams(
+    objects: Iterable[Any],
+    field_name: str,
+    context: TemplateContext = None,
+    request: WSGIRequest = None
+) -> list[tuple[Any, str]]:
+    """
+    Render the `field_name` stream of each object in a queryset
+    (or any other iterable of model instances).
 
-    return "\n".join(output)
+    Returns a list of `(object, html)` pairs.
+    """
+    objects = list(objects)
+    outputs = render_streams(
+        (getattr(obj, field_name) for obj in objects),
+        context=context,
+        request=request
+    )
+    return list(zip(objects, outputs))
 
 
 def render_block(
@@ -109,9 +278,16 @@ def render_block(
     queryset = processor.get_queryset()
     pk = model._meta.pk.get_prep_value(record["pk"])
 
+    store = get_current_store()
+    if store is not None and pk in store.instances[model]:
+        return get_block_output(processor, store.instances[model][pk], context, request)
+
     try:
         block = queryset.get(pk=pk)
     except (KeyError, ObjectDoesNotExist, MultipleObjectsReturned):
         logger.warning("Invalid block: %r", record)
     else:
+        processor.prepare([block], context, request=request)
+        if store is not None:
+            store.instances[model][pk] = block
         return get_block_output(processor, block, context, request)
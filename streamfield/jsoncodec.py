@@ -0,0 +1,103 @@
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .conf import JSON_CODEC
+
+# Codecs tried by the "auto" mode, fastest first.
+CODECS = ("orjson", "msgspec", "json")
+
+
+def _json_codec():
+    def loads(value):
+        return json.loads(value)
+
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False)
+
+    def dumps_bytes(value):
+        return dumps(value).encode()
+
+    return loads, dumps, dumps_bytes
+
+
+def _orjson_codec():
+    import orjson
+
+    def loads(value):
+        return orjson.loads(value)
+
+    def dumps_bytes(value):
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            return json.dumps(value, ensure_ascii=False).encode()
+
+    def dumps(value):
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            return json.dumps(value, ensure_ascii=False)
+
+    return loads, dumps, dumps_bytes
+
+
+def _msgspec_codec():
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+    encoder = msgspec.json.Encoder()
+
+    def loads(value):
+        try:
+            return decoder.decode(value)
+        except msgspec.DecodeError as exc:
+            doc = value.decode(errors="replace") if isinstance(value, bytes) else value
+            raise json.JSONDecodeError(str(exc), doc, 0) from exc
+
+    def dumps_bytes(value):
+        try:
+            return encoder.encode(value)
+        except (TypeError, msgspec.EncodeError):
+            return json.dumps(value, ensure_ascii=False).encode()
+
+    def dumps(value):
+        return dumps_bytes(value).decode()
+
+    return loads, dumps, dumps_bytes
+
+
+def get_codec(name: str):
+    """
+    Get the `(loads, dumps, dumps_bytes)` functions of the given codec:
+    "orjson", "msgspec", "json" (the standard library) or "auto" - the fastest
+    installed one.
+
+    `loads` accepts `str` or `bytes` and raises `json.JSONDecodeError`
+    on invalid input. `dumps` returns `str`, `dumps_bytes` returns UTF-8
+    encoded `bytes`. Both fall back to the standard library for values
+    the fast codecs cannot encode.
+    """
+    factories = {
+        "orjson": _orjson_codec,
+        "msgspec": _msgspec_codec,
+        "json": _json_codec,
+    }
+
+    if name == "auto":
+        for codec_name in CODECS:
+            try:
+                return factories[codec_name]()
+            except ImportError:
+                continue
+
+    if name not in factories:
+        raise ImproperlyConfigured("Unknown JSON codec: %r" % name)
+
+    try:
+        return factories[name]()
+    except ImportError as exc:
+        raise ImproperlyConfigured("JSON codec %r is not installed" % name) from exc
+
+
+loads, dumps, dumps_bytes = get_codec(JSON_CODEC)
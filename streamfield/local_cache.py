@@ -0,0 +1,95 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .conf import LOCAL_CACHE_MAX_SIZE
+
+
+def get_size(value: Any) -> int:
+    """
+    Approximate memory size of a cached value, in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, tuple):
+        size += sum(get_size(item) for item in value)
+    return size
+
+
+class LocalCache:
+    """
+    Thread-safe in-process LRU cache with per-entry TTL,
+    bounded by the total size of its entries.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self._data = OrderedDict()  # type: OrderedDict[str, tuple[Any, float, int]]
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return bool(self.get_many([key]))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys) -> dict[str, Any]:
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+
+                value, expires_at, size = entry
+                if expires_at <= now:
+                    self._remove(key)
+                    continue
+
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set(self, key: str, value: Any, timeout: Optional[float]):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, data: dict[str, Any], timeout: Optional[float]):
+        if not timeout or timeout <= 0:
+            return
+
+        expires_at = time.monotonic() + timeout
+        with self._lock:
+            for key, value in data.items():
+                size = get_size(key) + get_size(value)
+                if size > self.max_size:
+                    continue
+
+                if key in self._data:
+                    self._remove(key)
+
+                self._data[key] = (value, expires_at, size)
+                self.size += size
+
+            while self.size > self.max_size:
+                key = next(iter(self._data))
+                self._remove(key)
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _remove(self, key: str):
+        value, expires_at, size = self._data.pop(key)
+        self.size -= size
+
+
+local_cache = LocalCache(LOCAL_CACHE_MAX_SIZE)
@@ -0,0 +1,22 @@
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+
+from .store import block_store
+
+
+@sync_and_async_middleware
+def BlockStoreMiddleware(get_response):
+    """
+    Share block instances and rendered HTML between all streams
+    and blocks rendered within a request.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with block_store():
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with block_store():
+                return get_response(request)
+
+    return middleware
@@ -1,12 +1,101 @@
+import hashlib
+import os
+import time
 from collections.abc import Iterable
 
 from django.apps import apps
+from django.conf import settings
+from django.contrib.sites.shortcuts import get_current_site
 from django.core.cache import DEFAULT_CACHE_ALIAS, caches
-from django.template.loader import render_to_string
+from django.template.base import Template as DjangoTemplate
+from django.template.loader import get_template, select_template
+from django.utils import translation
+from django.utils.autoreload import DJANGO_AUTORELOAD_ENV
 
 from .conf import DEFAULT_TEMPLATE_ENGINE
+from .context import BlockContext, flatten_context
+from .local_cache import local_cache
 from .typing import BlockInstance, TemplateContext
-from .utils import camel_case_to_snake_case
+from .utils import camel_case_to_snake_case, resolve_path
+
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+# Compiled block templates, keyed by template engine and template names.
+template_cache = {}
+
+
+def clear_template_cache():
+    """
+    Clear the compiled block templates.
+    """
+    template_cache.clear()
+
+
+def use_template_cache():
+    """
+    Check whether compiled block templates can be reused.
+
+    In debug mode, templates are reused only while the autoreloader
+    is running, since it clears them when template files change.
+    """
+    return not settings.DEBUG or os.environ.get(DJANGO_AUTORELOAD_ENV) == "true"
+
+
+def get_vary_key(vary_on, context=None, request=None):
+    """
+    Get a hash of the values listed in `vary_on`.
+
+    Each item of `vary_on` is one of:
+        * "language" - the active language;
+        * "site" - the domain of the current site;
+        * "request.<path>" - an attribute of the request, e.g. "request.user.pk";
+        * "<path>" - a context variable, e.g. "classes" or "page.pk".
+
+    :type vary_on: Iterable[str]
+    :type context: TemplateContext|None
+    :type request: django.core.handlers.wsgi.WSGIRequest
+    :rtype: str|None
+    """
+    if not vary_on:
+        return None
+
+    context = flatten_context(context)
+    if request is None:
+        request = context.get("request")
+
+    values = []
+    for item in vary_on:
+        if item == "language":
+            values.append(translation.get_language())
+        elif item == "site":
+            values.append(get_current_site(request).domain if request is not None else None)
+        elif item.startswith("request."):
+            values.append(resolve_path(request, item[len("request."):]))
+        else:
+            values.append(resolve_path(context, item))
+
+    return hashlib.md5(repr(values).encode()).hexdigest()
+
+
+def wait_cache_entries(cache, cache_keys, timeout):
+    """
+    Wait for the given keys to appear in cache, but no longer
+    than `timeout` seconds. Returns the found values.
+
+    :type cache: django.core.cache.backends.base.BaseCache
+    :type cache_keys: list[str]
+    :type timeout: float
+    :rtype: dict[str, Any]
+    """
+    found = {}
+    pending = set(cache_keys)
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        time.sleep(CACHE_LOCK_POLL_INTERVAL)
+        values = cache.get_many(pending)
+        found.update(values)
+        pending.difference_update(values)
+    return found
 
 
 class BaseProcessor:
@@ -32,6 +121,21 @@ class BaseProcessor:
         """
         raise NotImplementedError
 
+    def prepare(self, blocks, context=None, request=None):
+        """
+        Prepare the content blocks of the model before any of them is rendered.
+
+        This method is called once per render with all the fetched blocks
+        of the model, so that the data required by the blocks can be loaded
+        with a single query and attached to each block, e.g. as an attribute
+        to be used by `get_context()`.
+
+        :type blocks: list[BlockInstance]
+        :type context: TemplateContext|None
+        :type request: django.core.handlers.wsgi.WSGIRequest
+        """
+        pass
+
     def get_context(self, block):
         """
         Get the context data for rendering a content block.
@@ -67,14 +171,37 @@ class BaseProcessor:
         """
         raise NotImplementedError
 
+    def render_content(self, block, context=None, request=None):
+        """
+        Render a content block as HTML, bypassing the cache.
+
+        :type block: BlockInstance
+        :type context: TemplateContext|None
+        :type request: django.core.handlers.wsgi.WSGIRequest
+        :rtype: str
+        """
+        raise NotImplementedError
+
 
 class DefaultProcessor(BaseProcessor):
     select_related = None
+    prefetch_related = None
+    only = None
+    defer = None
+    annotate = None
+    shared_related = None
     template_engine = DEFAULT_TEMPLATE_ENGINE
     template_name = None
     cache = False
     cache_alias = DEFAULT_CACHE_ALIAS
     cache_ttl = 3600
+    cache_vary_on = ()
+    cache_stale_ttl = None
+    cache_lock = False
+    cache_lock_timeout = 10
+    cache_lock_wait = 1
+    cache_local = False
+    cache_local_ttl = 60
 
     def get_queryset(self):
         queryset = self.model._default_manager.all()
@@ -82,6 +209,25 @@ class DefaultProcessor(BaseProcessor):
             queryset = queryset.select_related(self.select_related)
         elif isinstance(self.select_related, Iterable):
             queryset = queryset.select_related(*self.select_related)
+
+        if isinstance(self.prefetch_related, str):
+            queryset = queryset.prefetch_related(self.prefetch_related)
+        elif isinstance(self.prefetch_related, Iterable):
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+
+        if self.annotate:
+            queryset = queryset.annotate(**self.annotate)
+
+        if isinstance(self.only, str):
+            queryset = queryset.only(self.only)
+        elif isinstance(self.only, Iterable):
+            queryset = queryset.only(*self.only)
+
+        if isinstance(self.defer, str):
+            queryset = queryset.defer(self.defer)
+        elif isinstance(self.defer, Iterable):
+            queryset = queryset.defer(*self.defer)
+
         return queryset
 
     def get_context(self, block):
@@ -96,38 +242,110 @@ class DefaultProcessor(BaseProcessor):
         )
 
     def render(self, block, context=None, request=None):
-        extra_context = self.get_context(block)
-        context = dict(context or {}, **(extra_context or {}))
-        template_names = self.get_template_names(block)
-
         if not self.cache:
-            return render_to_string(
-                template_names,
-                context=context,
-                request=request,
-                using=self.template_engine
-            )
-
-        cache = caches[self.cache_alias]
-        cache_key = self.get_cache_key(block)
-        if cache_key in cache:
-            return cache.get(cache_key)
-
-        content = render_to_string(
-            template_names,
-            context=context,
-            request=request,
-            using=self.template_engine
+            return self.render_content(block, context, request=request)
+
+        cache = self.get_cache()
+        cache_key = self.get_versioned_cache_key(
+            self.get_cache_key(block),
+            self.get_cache_generation(),
+            self.get_cache_vary_key(context, request)
         )
 
-        cache_ttl = self.get_cache_ttl(block)
-        if cache_ttl is None:
-            cache.set(cache_key, content)
-        else:
-            cache.set(cache_key, content, cache_ttl)
+        locked = False
+        value = local_cache.get(cache_key) if self.cache_local else None
+        if value is None:
+            value = cache.get(cache_key)
+            if value is not None and self.cache_local:
+                local_cache.set(cache_key, value, self.get_local_cache_timeout(None))
+
+        if value is not None:
+            content, stale = self.parse_cache_entry(value)
+            if not stale:
+                return content
+
+            # Serve stale content unless this worker has been chosen to refresh it.
+            locked = self.acquire_cache_lock(cache_key)
+            if not locked:
+                return content
+        elif self.cache_lock:
+            locked = self.acquire_cache_lock(cache_key)
+            if not locked:
+                found = wait_cache_entries(cache, [cache_key], self.cache_lock_wait)
+                if cache_key in found:
+                    return self.parse_cache_entry(found[cache_key])[0]
+
+        try:
+            content = self.render_content(block, context, request=request)
+
+            value, timeout = self.make_cache_entry(content, self.get_cache_ttl(block))
+            if timeout is None:
+                cache.set(cache_key, value)
+            else:
+                cache.set(cache_key, value, timeout)
+
+            if self.cache_local:
+                local_cache.set(cache_key, value, self.get_local_cache_timeout(timeout))
+        finally:
+            if locked:
+                self.release_cache_lock(cache_key)
 
         return content
 
+    def render_content(self, block, context=None, request=None):
+        extra_context = self.get_context(block) or {}
+        template = self.get_template(block)
+        if isinstance(context, BlockContext) and isinstance(getattr(template, "template", None), DjangoTemplate):
+            # Push the block context on top of the shared parent context
+            # instead of copying the parent context for each block.
+            # Template tags may push dicts without popping them,
+            # so the stack is restored to its exact depth afterwards.
+            depth = len(context.dicts)
+            context.update(extra_context)
+            try:
+                return template.template.render(context)
+            finally:
+                del context.dicts[depth:]
+
+        context = dict(flatten_context(context), **extra_context)
+        return template.render(context, request)
+
+    def get_template(self, block):
+        """
+        Get the compiled template for rendering the content block.
+
+        Templates are resolved once for each distinct result
+        of `get_template_names()` and then reused (see `use_template_cache()`).
+
+        :type block: BlockInstance
+        :rtype: django.template.backends.base.Template
+        """
+        template_names = self.get_template_names(block)
+        if not isinstance(template_names, str):
+            template_names = tuple(template_names)
+
+        use_cache = use_template_cache()
+        cache_key = (self.template_engine, template_names)
+        template = template_cache.get(cache_key) if use_cache else None
+        if template is None:
+            if isinstance(template_names, str):
+                template = get_template(template_names, using=self.template_engine)
+            else:
+                template = select_template(template_names, using=self.template_engine)
+
+            if use_cache:
+                template_cache[cache_key] = template
+
+        return template
+
+    def get_cache(self):
+        """
+        Get the cache backend used to store rendered blocks.
+
+        :rtype: django.core.cache.backends.base.BaseCache
+        """
+        return caches[self.cache_alias]
+
     def get_cache_key(self, block):
         """
         Generate a cache key for a content block.
@@ -140,12 +358,148 @@ class DefaultProcessor(BaseProcessor):
         :type block: BlockInstance
         :rtype: str
         """
+        return self.get_pk_cache_key(block.pk)
+
+    def get_pk_cache_key(self, pk):
+        """
+        Generate a cache key from the primary key of a content block.
+
+        Used by `render_stream` to look up cached blocks before
+        the block instances are fetched from the database.
+
+        :type pk: Any
+        :rtype: str
+        """
         return "{}.{}:{}".format(
             self.app_label,
             self.model_name,
-            block.pk
+            pk
         )
 
+    def get_versioned_cache_key(self, cache_key, generation, vary_key=None):
+        """
+        Combine a cache key with the current cache generation of the model
+        and the hash of the context values the block depends on.
+
+        :type cache_key: str
+        :type generation: int
+        :type vary_key: str|None
+        :rtype: str
+        """
+        if vary_key:
+            return "{}#{}#{}".format(cache_key, generation, vary_key)
+        return "{}#{}".format(cache_key, generation)
+
+    def get_cache_vary_key(self, context=None, request=None):
+        """
+        Get a hash of the values listed in `cache_vary_on`.
+        See `get_vary_key()` for the supported values.
+
+        :type context: TemplateContext|None
+        :type request: django.core.handlers.wsgi.WSGIRequest
+        :rtype: str|None
+        """
+        return get_vary_key(self.cache_vary_on, context, request)
+
+    def get_cache_generation_key(self):
+        """
+        Get the cache key of the generation counter of the model.
+
+        :rtype: str
+        """
+        return "{}.{}:generation".format(
+            self.app_label,
+            self.model_name
+        )
+
+    def get_cache_generation(self):
+        """
+        Get the current cache generation of the model.
+
+        Every cached block of the model is stored under a key that includes
+        the generation, so changing the generation invalidates all of them.
+
+        :rtype: int
+        """
+        cache = self.get_cache()
+        generation_key = self.get_cache_generation_key()
+        generation = cache.get(generation_key)
+        if generation is None:
+            generation = time.time_ns()
+            if not cache.add(generation_key, generation, None):
+                generation = cache.get(generation_key, generation)
+        return generation
+
+    def invalidate_cache(self):
+        """
+        Invalidate the cached HTML of all blocks of the model.
+        """
+        self.get_cache().set(self.get_cache_generation_key(), time.time_ns(), None)
+
+    def make_cache_entry(self, content, cache_ttl):
+        """
+        Prepare the rendered HTML for storing in cache.
+
+        When `cache_stale_ttl` is set, the content is stored along with
+        its expiration time and is kept in cache for `cache_stale_ttl`
+        more seconds, during which it is served stale.
+        Returns a tuple of the value to store and its cache timeout.
+
+        :type content: str
+        :type cache_ttl: int|None
+        :rtype: tuple[Any, int|None]
+        """
+        if not self.cache_stale_ttl:
+            return content, cache_ttl
+
+        if cache_ttl is None:
+            cache_ttl = self.get_cache().default_timeout
+            if cache_ttl is None:
+                return content, None
+
+        return (content, time.time() + cache_ttl), cache_ttl + self.cache_stale_ttl
+
+    def parse_cache_entry(self, value):
+        """
+        Get the rendered HTML from a cached value and check
+        whether the value is stale.
+
+        :type value: Any
+        :rtype: tuple[str, bool]
+        """
+        if isinstance(value, tuple):
+            content, expires_at = value
+            return content, time.time() > expires_at
+        return value, False
+
+    def get_local_cache_timeout(self, timeout):
+        """
+        Get the time-to-live of a block in the in-process cache.
+        It never exceeds the timeout of the shared cache.
+
+        :type timeout: int|None
+        :rtype: int
+        """
+        if timeout is None:
+            return self.cache_local_ttl
+        return min(self.cache_local_ttl, timeout)
+
+    def acquire_cache_lock(self, cache_key):
+        """
+        Try to acquire a lock for rendering the block stored under
+        the given key. Only one worker can hold the lock at a time.
+
+        :type cache_key: str
+        :rtype: bool
+        """
+        return self.get_cache().add(cache_key + ":lock", 1, self.cache_lock_timeout)
+
+    def release_cache_lock(self, cache_key):
+        """
+        :type cache_key: str
+        """
+        self.get_cache().delete(cache_key + ":lock")
+
     def get_cache_ttl(self, block):
         """
         Get the cache time-to-live (TTL) for a content block.
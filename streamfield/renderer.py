@@ -0,0 +1,513 @@
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Union
+
+from django.core.handlers.wsgi import WSGIRequest
+
+from . import blocks, exceptions, jsoncodec
+from .context import BlockContext
+from .local_cache import local_cache
+from .logging import logger
+from .processors import BaseProcessor, DefaultProcessor, wait_cache_entries
+from .store import BlockStore, get_current_store, use_store
+from .stream import StreamBlock
+from .typing import BlockInstance, BlockModel, TemplateContext
+
+Record = tuple[dict, BlockModel]
+
+
+def parse_stream(stream: Union[str, list]) -> list[Record]:
+    """
+    Validate the stream and return its visible records
+    paired with their block models.
+    """
+    if isinstance(stream, str):
+        stream = jsoncodec.loads(stream)
+
+    if not isinstance(stream, list):
+        raise exceptions.InvalidStreamTypeError(stream)
+
+    records = []
+    for record in stream:
+        if not blocks.is_valid(record):
+            raise exceptions.InvalidStreamBlockError(record)
+
+        visible = record.get("visible", True)
+        if not visible:
+            continue
+
+        try:
+            model = record.model if isinstance(record, StreamBlock) else blocks.get_model(record)
+        except LookupError:
+            logger.warning("Invalid block: %r", record)
+            continue
+
+        records.append((record, model))
+
+    return records
+
+
+def get_pk(record: dict, model: BlockModel) -> Any:
+    if isinstance(record, StreamBlock):
+        return record.pk
+    return model._meta.pk.get_prep_value(record["pk"])
+
+
+def get_block_output(
+    processor: BaseProcessor,
+    block: BlockInstance,
+    context: TemplateContext,
+    request: WSGIRequest = None
+):
+    try:
+        return processor.render(block, context, request=request)
+    except exceptions.SkipBlock:
+        return ""
+
+
+class StreamRenderer:
+    """
+    Renders stream records using a shared state: processors,
+    block instances and cached HTML are resolved once per block model
+    for all records added to the renderer.
+
+    Usage:
+        renderer = StreamRenderer(context, request)
+        renderer.add(records)
+        renderer.fetch()
+        html = renderer.render(records)
+    """
+
+    def __init__(
+        self,
+        context: TemplateContext = None,
+        request: WSGIRequest = None,
+        track_generations: bool = False
+    ):
+        self.context = context
+        self.request = request
+        # Load the cache generations of every block model added to the renderer,
+        # including the models of nested streams, before its blocks are fetched.
+        self.track_generations = track_generations
+        self.processors = {}  # type: dict[BlockModel, BaseProcessor]
+        # Block instances are shared by all renderers of the request
+        # and by the renderers of nested streams.
+        self.store = get_current_store() or BlockStore()
+        self.instances = self.store.instances
+        # Block instances passed by the caller. They may have been fetched
+        # without the queryset of the processor, so they are not shared.
+        self.local_instances = defaultdict(dict)  # type: dict[BlockModel, dict[Any, BlockInstance]]
+        self.cached_outputs = {}  # type: dict[tuple[BlockModel, Any], str]
+        self.generations = {}  # type: dict[BlockModel, int]
+        self.vary_keys = {}  # type: dict[BlockModel, Optional[str]]
+        self._pending_ids = defaultdict(set)  # type: dict[BlockModel, set]
+        self._unprepared = defaultdict(list)  # type: dict[BlockModel, list[BlockInstance]]
+        self._pending_outputs = defaultdict(dict)
+        self._locks = []  # type: list[tuple[BaseProcessor, str]]
+        self._block_context = None  # type: Optional[BlockContext]
+
+    def get_processor(self, model: BlockModel) -> BaseProcessor:
+        processor = self.processors.get(model)
+        if processor is None:
+            processor = self.processors[model] = blocks.get_processor(model)
+        return processor
+
+    @property
+    def block_context(self) -> BlockContext:
+        """
+        Template context shared by all blocks rendered by this renderer.
+        It is built once, and each block pushes its own context on top of it.
+        """
+        if self._block_context is None:
+            self._block_context = BlockContext(self.context, self.request)
+        return self._block_context
+
+    def get_context(self, processor: BaseProcessor):
+        """
+        Get the context to be passed to the processor. Only `DefaultProcessor`
+        subclasses accept the layered context; others get the parent context.
+        """
+        if isinstance(processor, DefaultProcessor):
+            return self.block_context
+        return self.context
+
+    def is_cacheable(self, model: BlockModel) -> bool:
+        """
+        Check whether the renderer caches the blocks of the model itself.
+
+        Processors that override `render()` handle the cache on their own.
+        Processors that override `get_cache_key()` need the block instance
+        to build the cache key, so their blocks cannot be looked up before
+        they are fetched. The blocks of both are rendered one by one.
+        """
+        processor = self.get_processor(model)
+        return (
+            bool(getattr(processor, "cache", False))
+            and getattr(processor.render, "__func__", None) is DefaultProcessor.render
+            and getattr(processor.get_cache_key, "__func__", None) is DefaultProcessor.get_cache_key
+        )
+
+    def add(self, records: Iterable[Record]):
+        """
+        Register records to be rendered.
+
+        Cached blocks are looked up immediately with a single `get_many`
+        call per cache backend. The remaining blocks are scheduled
+        for fetching.
+        """
+        records = list(records)
+        if self.track_generations:
+            self.load_generations({model for record, model in records})
+        self._lookup_cache(records)
+
+        for record, model in records:
+            pk = get_pk(record, model)
+            if (model, pk) in self.cached_outputs:
+                continue
+            if pk in self.local_instances[model] or pk in self.instances[model]:
+                continue
+            self._pending_ids[model].add(pk)
+
+    def add_instances(self, blocks: Iterable[BlockInstance]):
+        """
+        Register block instances that have already been fetched,
+        so that they are not fetched again. The instances are used
+        by this renderer only and take precedence over the shared ones.
+        """
+        for block in blocks:
+            model = type(block)
+            if block.pk not in self.local_instances[model]:
+                self.local_instances[model][block.pk] = block
+                self._unprepared[model].append(block)
+
+    def fetch(self, models: Iterable[BlockModel] = None):
+        """
+        Fetch the scheduled block instances with a single query per model.
+
+        Without `models`, the blocks of nested streams (`StreamField`s
+        of the fetched blocks) are fetched as well, level by level,
+        so the number of queries depends on the nesting depth
+        rather than on the number of container blocks.
+        """
+        if models is not None:
+            self._fetch(models)
+            return
+
+        while self._pending_ids:
+            fetched = self._fetch(list(self._pending_ids))
+            self.add(self.get_nested_records(fetched))
+
+    def _fetch(self, models: Iterable[BlockModel]) -> list[BlockInstance]:
+        fetched = []
+        for model in models:
+            ids = self._pending_ids.pop(model, None)
+            if ids:
+                queryset = self.get_processor(model).get_queryset()
+                fetched.extend(self._add_fetched(model, queryset.in_bulk(ids)))
+        return fetched
+
+    def _add_fetched(self, model: BlockModel, instances: dict[Any, BlockInstance]) -> Iterable[BlockInstance]:
+        if instances:
+            self.instances[model].update(instances)
+            self._unprepared[model].extend(instances.values())
+        return instances.values()
+
+    def get_nested_records(self, fetched: Iterable[BlockInstance]) -> list[Record]:
+        """
+        Get the records of the streams stored in the `StreamField`s
+        of the given blocks.
+        """
+        records = []
+        for block in fetched:
+            for field in blocks.get_stream_fields(type(block)):
+                value = field.value_from_object(block)
+                try:
+                    records.extend(parse_stream(value))
+                except (TypeError, ValueError):
+                    # The error is raised again when the nested stream is rendered.
+                    logger.warning("Invalid nested stream: %r", value)
+        return records
+
+    def prepare(self):
+        """
+        Prepare the fetched blocks that have not been prepared yet.
+
+        The shared relations of all block models are loaded first,
+        then the blocks of each model are passed to the `prepare()` method
+        of its processor. Each block is prepared only once.
+        """
+        unprepared = self._unprepared
+        self._unprepared = defaultdict(list)
+
+        self.fetch_shared_related(unprepared)
+        for model, model_blocks in unprepared.items():
+            if model_blocks:
+                self.get_processor(model).prepare(model_blocks, self.context, request=self.request)
+
+    def fetch_shared_related(self, instances: dict[BlockModel, list[BlockInstance]]):
+        """
+        Load the foreign keys listed in the `shared_related` option of
+        the processors with a single query per related model, even if
+        the related model is referenced by several block models.
+        """
+        per_model_lookups = defaultdict(list)
+        for model, model_blocks in instances.items():
+            shared_related = getattr(self.get_processor(model), "shared_related", None)
+            if not model_blocks or not shared_related:
+                continue
+
+            if isinstance(shared_related, str):
+                shared_related = [shared_related]
+
+            for field_name in shared_related:
+                field = model._meta.get_field(field_name)
+                per_model_lookups[(field.related_model, field.target_field.attname)].extend(
+                    (block, field)
+                    for block in model_blocks
+                    if not field.is_cached(block) and getattr(block, field.attname) is not None
+                )
+
+        for (related_model, target_field), lookups in per_model_lookups.items():
+            if not lookups:
+                continue
+
+            ids = {getattr(block, field.attname) for block, field in lookups}
+            related_objects = related_model._base_manager.in_bulk(ids, field_name=target_field)
+            for block, field in lookups:
+                related_object = related_objects.get(getattr(block, field.attname))
+                if related_object is not None:
+                    field.set_cached_value(block, related_object)
+
+    def iter_render(self, records: Iterable[Record]) -> Iterator[str]:
+        """
+        Render the records one by one, yielding the non-empty output
+        of each block. Block models that have not been fetched yet
+        are fetched right before their first block is rendered.
+        """
+        try:
+            for record, model in records:
+                if model in self._pending_ids:
+                    self.fetch([model])
+
+                output = self.render_record(record, model)
+                if output:
+                    yield output
+        finally:
+            self.flush()
+
+    def render(self, records: Iterable[Record]) -> str:
+        return "\n".join(self.iter_render(records))
+
+    def render_each(self, records: Iterable[Record]) -> list[str]:
+        """
+        Render the records, returning the output of each record,
+        including the empty ones.
+        """
+        try:
+            return [
+                self.render_record(record, model)
+                for record, model in records
+            ]
+        finally:
+            self.flush()
+
+    def render_record(self, record: dict, model: BlockModel) -> str:
+        pk = get_pk(record, model)
+        if (model, pk) in self.cached_outputs:
+            return self.cached_outputs[(model, pk)]
+
+        block = self.local_instances[model].get(pk)
+        if block is None:
+            block = self.instances[model].get(pk)
+        if block is None:
+            logger.warning("Block does not exist: %r", record)
+            return ""
+
+        if self._unprepared:
+            self.prepare()
+
+        return self.render_instance(block)
+
+    def render_instance(self, block: BlockInstance) -> str:
+        # Nested streams rendered by the block template
+        # reuse the instances fetched by this renderer.
+        with use_store(self.store):
+            return self._render_instance(block)
+
+    def _render_instance(self, block: BlockInstance) -> str:
+        model = type(block)
+        processor = self.get_processor(model)
+        if not self.is_cacheable(model):
+            return get_block_output(processor, block, self.get_context(processor), self.request)
+
+        try:
+            output = processor.render_content(block, self.get_context(processor), request=self.request)
+        except exceptions.SkipBlock:
+            return ""
+
+        cache_key = processor.get_versioned_cache_key(
+            processor.get_pk_cache_key(block.pk),
+            self._get_generation(model),
+            self._get_vary_key(model)
+        )
+        value, timeout = processor.make_cache_entry(output, processor.get_cache_ttl(block))
+        self._pending_outputs[(processor.get_cache(), timeout)][cache_key] = value
+        if processor.cache_local:
+            local_cache.set(cache_key, value, processor.get_local_cache_timeout(timeout))
+        self.set_cached_output(model, block.pk, output)
+        return output
+
+    def set_cached_output(self, model: BlockModel, pk: Any, output: str):
+        self.cached_outputs[(model, pk)] = output
+        self.store.outputs[(model, pk, self._get_vary_key(model))] = output
+
+    def flush(self):
+        """
+        Store the rendered HTML of cacheable blocks with a single
+        `set_many` call per cache backend and TTL, then release
+        the render locks held by this renderer.
+        """
+        pending_outputs = self._pending_outputs
+        self._pending_outputs = defaultdict(dict)
+
+        for (cache, timeout), data in pending_outputs.items():
+            if timeout is None:
+                cache.set_many(data)
+            else:
+                cache.set_many(data, timeout)
+
+        locks = self._locks
+        self._locks = []
+        for processor, cache_key in locks:
+            processor.release_cache_lock(cache_key)
+
+    def _get_generation(self, model: BlockModel) -> int:
+        generation = self.generations.get(model)
+        if generation is None:
+            generation = self.generations[model] = self.get_processor(model).get_cache_generation()
+        return generation
+
+    def _get_vary_key(self, model: BlockModel) -> Optional[str]:
+        if model not in self.vary_keys:
+            processor = self.get_processor(model)
+            self.vary_keys[model] = processor.get_cache_vary_key(self.context, self.request)
+        return self.vary_keys[model]
+
+    def load_generations(self, models: Iterable[BlockModel]) -> dict[BlockModel, int]:
+        """
+        Load the cache generations of the given models with a single
+        `get_many` call per cache backend. Processors without a cache
+        generation get a constant one.
+        """
+        models = list(models)
+        per_cache_keys = defaultdict(dict)
+        for model in models:
+            if model not in self.generations:
+                processor = self.get_processor(model)
+                if not hasattr(processor, "get_cache_generation_key"):
+                    self.generations[model] = 0
+                    continue
+                per_cache_keys[processor.get_cache()][processor.get_cache_generation_key()] = model
+
+        for cache, keys in per_cache_keys.items():
+            found = cache.get_many(keys.keys())
+            for generation_key, model in keys.items():
+                if generation_key in found:
+                    self.generations[model] = found[generation_key]
+                else:
+                    self._get_generation(model)
+
+        return {
+            model: self.generations[model]
+            for model in models
+        }
+
+    def _lookup_cache(self, records: list[Record]):
+        """
+        Look up the cached HTML of cacheable blocks. Cache keys are built
+        from the stream records, so block instances are not required.
+        """
+        cacheable_records = []
+        for record, model in records:
+            if not self.is_cacheable(model):
+                continue
+
+            pk = get_pk(record, model)
+            if (model, pk) in self.cached_outputs:
+                continue
+
+            # Rendered earlier in the same request.
+            output = self.store.outputs.get((model, pk, self._get_vary_key(model)))
+            if output is not None:
+                self.cached_outputs[(model, pk)] = output
+                continue
+
+            cacheable_records.append((model, pk))
+
+        if not cacheable_records:
+            return
+
+        self.load_generations({model for model, pk in cacheable_records})
+
+        per_cache_keys = defaultdict(dict)
+        for model, pk in cacheable_records:
+            processor = self.get_processor(model)
+            cache_key = processor.get_versioned_cache_key(
+                processor.get_pk_cache_key(pk),
+                self.generations[model],
+                self._get_vary_key(model)
+            )
+            per_cache_keys[processor.get_cache()][cache_key] = (model, pk)
+
+        for cache, keys in per_cache_keys.items():
+            found = self._get_many(cache, keys)
+
+            waiting_keys = []
+            for cache_key, (model, pk) in keys.items():
+                processor = self.get_processor(model)
+                if cache_key in found:
+                    content, stale = processor.parse_cache_entry(found[cache_key])
+                    if stale and self._acquire_lock(processor, cache_key):
+                        # This worker has been chosen to refresh the block.
+                        continue
+                    self.set_cached_output(model, pk, content)
+                elif getattr(processor, "cache_lock", False):
+                    if not self._acquire_lock(processor, cache_key):
+                        waiting_keys.append(cache_key)
+
+            if waiting_keys:
+                # Another worker is rendering these blocks right now.
+                timeout = max(self.get_processor(keys[key][0]).cache_lock_wait for key in waiting_keys)
+                for cache_key, value in wait_cache_entries(cache, waiting_keys, timeout).items():
+                    model, pk = keys[cache_key]
+                    self.set_cached_output(model, pk, self.get_processor(model).parse_cache_entry(value)[0])
+
+    def _get_many(self, cache, keys: dict[str, tuple[BlockModel, Any]]) -> dict[str, Any]:
+        """
+        Look up the keys in the in-process cache first (for the models
+        with `cache_local` enabled), then in the shared cache.
+        """
+        found = local_cache.get_many([
+            cache_key
+            for cache_key, (model, pk) in keys.items()
+            if self.get_processor(model).cache_local
+        ])
+
+        missing_keys = [cache_key for cache_key in keys if cache_key not in found]
+        if not missing_keys:
+            return found
+
+        shared_found = cache.get_many(missing_keys)
+        for cache_key, value in shared_found.items():
+            processor = self.get_processor(keys[cache_key][0])
+            if processor.cache_local:
+                local_cache.set(cache_key, value, processor.get_local_cache_timeout(None))
+
+        found.update(shared_found)
+        return found
+
+    def _acquire_lock(self, processor: BaseProcessor, cache_key: str) -> bool:
+        locked = processor.acquire_cache_lock(cache_key)
+        if locked:
+            self._locks.append((processor, cache_key))
+        return locked
@@ -0,0 +1,91 @@
+from functools import partial
+
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from . import blocks, processors
+from .typing import BlockModel
+
+connected_models = set()  # type: set[BlockModel]
+
+
+def invalidate_cache(model: BlockModel):
+    """
+    Invalidate the cached HTML of all blocks of the given model,
+    along with the cached streams that contain such blocks.
+    """
+    processor = blocks.get_processor(model)
+    if hasattr(processor, "invalidate_cache"):
+        processor.invalidate_cache()
+
+
+def invalidate_cache_on_commit(model: BlockModel, using: str = None):
+    """
+    Invalidate the cache now and once more when the current transaction
+    is committed. Until then, concurrent requests still see the old rows
+    and may cache them under the new generation.
+    """
+    invalidate_cache(model)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(partial(invalidate_cache, model), using=using)
+
+
+def handle_block_change(sender, using=None, **kwargs):
+    invalidate_cache_on_commit(sender, using)
+
+
+def handle_block_m2m_change(sender, instance, action, model, using=None, **kwargs):
+    if action not in {"post_add", "post_remove", "post_clear"}:
+        return
+
+    for changed_model in (type(instance), model):
+        if changed_model in connected_models:
+            invalidate_cache_on_commit(changed_model, using)
+
+
+def connect_signals(model: BlockModel):
+    """
+    Connect cache invalidation handlers for the given block model.
+    """
+    connected_models.add(model)
+    dispatch_uid = "streamfield:%s" % model._meta.label_lower
+    post_save.connect(handle_block_change, sender=model, dispatch_uid=dispatch_uid)
+    post_delete.connect(handle_block_change, sender=model, dispatch_uid=dispatch_uid)
+
+    for field in model._meta.get_fields():
+        if not field.many_to_many:
+            continue
+
+        through = field.through if field.auto_created else field.remote_field.through
+        m2m_changed.connect(
+            handle_block_m2m_change,
+            sender=through,
+            dispatch_uid="streamfield:%s" % through._meta.label_lower
+        )
+
+
+def handle_file_changed(sender, file_path, **kwargs):
+    """
+    Clear the compiled block templates when a template file
+    is changed and the autoreloader is active.
+    """
+    if file_path.suffix != ".py":
+        processors.clear_template_cache()
+
+
+def handle_setting_changed(sender, setting, **kwargs):
+    """
+    Clear the compiled block templates when the template engines
+    are reconfigured, e.g. by `override_settings`.
+    """
+    if setting == "TEMPLATES":
+        processors.clear_template_cache()
+
+
+def preload_templates(sender, **kwargs):
+    """
+    Compile the templates of all block models on the first request.
+    """
+    request_started.disconnect(preload_templates, dispatch_uid="streamfield:preload_templates")
+    blocks.preload_templates(blocks.get_block_models())
@@ -14,11 +14,16 @@ class StreamField {
         READY: "ready"
     };
 
+    // Количество блоков, отрисовываемых сразу. Остальные блоки
+    // отрисовываются по мере их появления в области видимости.
+    static WINDOW_SIZE = 50;
+
     static CSS = {
         field: "stream-field",
         control: "stream-field__control",
         blocks: "stream-field__blocks",
         block: "stream-field__block",
+        placeholder: "stream-field__block--placeholder",
         buttons: "stream-field__buttons",
         sortableHandler: "stream-field__sortable-handler",
         visibilitySwitch: "stream-field__visibility-switch",
@@ -34,10 +39,16 @@ class StreamField {
         this.buttons = this.field.querySelector(`.${this.CSS.buttons}`);
 
         this._sortable = this._initSortable();
+        this._observer = this._initObserver();
+        this._pendingPlaceholders = new Set();
         this._addListeners();
         this._updateBlockMap();
 
-        this.wrapPreloader(Promise.all([this.updateBlocks(), this.updateButtons()]));
+        if (this.field.dataset.bootstrapUrl) {
+            this.wrapPreloader(this.bootstrap());
+        } else {
+            this.wrapPreloader(Promise.all([this.updateBlocks(), this.updateButtons()]));
+        }
     }
 
     get STATUS() {
@@ -48,6 +59,10 @@ class StreamField {
         return this.constructor.CSS;
     }
 
+    get WINDOW_SIZE() {
+        return this.constructor.WINDOW_SIZE;
+    }
+
     /**
      * @returns {Array}
      */
@@ -116,6 +131,10 @@ class StreamField {
             this._sortable.destroy();
         }
 
+        if (this._observer) {
+            this._observer.disconnect();
+        }
+
         // TODO: remove event listeners
     }
 
@@ -176,6 +195,38 @@ class StreamField {
         });
     }
 
+    /**
+     * @returns {IntersectionObserver|null}
+     * @private
+     */
+    _initObserver() {
+        if (typeof IntersectionObserver === "undefined") {
+            return null;
+        }
+
+        return new IntersectionObserver(
+            entries => {
+                entries.forEach(entry => {
+                    if (entry.isIntersecting) {
+                        this._observer.unobserve(entry.target);
+                        this._pendingPlaceholders.add(entry.target.dataset.uuid);
+                    }
+                });
+
+                if (this._pendingPlaceholders.size) {
+                    const records = Array.from(this._pendingPlaceholders).map(uuid => {
+                        return this.getBlockByUUID(uuid);
+                    });
+                    this._pendingPlaceholders.clear();
+                    this.updateBlocks(records);
+                }
+            },
+            {
+                rootMargin: "200px 0px"
+            }
+        );
+    }
+
     _addListeners() {
         this.field.addEventListener("change", event => {
             const visibilitySwitch = event.target.closest(`.${this.CSS.visibilitySwitch}`);
@@ -221,7 +272,6 @@ class StreamField {
                                 block.remove();
 
                                 this.save();
-                                this.wrapPreloader(this.updateBlocks());
                             }
                         }
                     ],
@@ -273,6 +323,50 @@ class StreamField {
         this._blockMap[uuid] = block;
     }
 
+    /**
+     * Отрисовывает первые блоки потока и заглушки для остальных.
+     * Заглушки заменяются блоками при появлении в области видимости.
+     *
+     * @param {string} html
+     * @private
+     */
+    _renderWindow(html) {
+        this.blocks.innerHTML = html;
+
+        const records = this._observer ? this.value.slice(this.WINDOW_SIZE) : [];
+        records.forEach(record => {
+            const placeholder = document.createElement("div");
+            placeholder.className = `${this.CSS.block} ${this.CSS.placeholder}`;
+            placeholder.dataset.uuid = record.uuid;
+            this.blocks.append(placeholder);
+            this._observer.observe(placeholder);
+        });
+    }
+
+    /**
+     * Заменяет элемент блока с указанным UUID новым HTML.
+     * Если элемента нет, он добавляется в конец списка.
+     *
+     * @param {string} uuid
+     * @param {string} html
+     * @private
+     */
+    _patchBlock(uuid, html) {
+        const template = document.createElement("template");
+        template.innerHTML = html.trim();
+        const newElement = template.content.firstElementChild;
+        if (!newElement) {
+            return;
+        }
+
+        const oldElement = this.getBlocks().find(element => element.dataset.uuid === uuid);
+        if (oldElement) {
+            oldElement.replaceWith(newElement);
+        } else {
+            this.blocks.append(newElement);
+        }
+    }
+
     save() {
         this.value = this.getBlocks().map(block => {
             const uuid = block.dataset.uuid;
@@ -291,10 +385,26 @@ class StreamField {
         });
     }
 
-    updateBlocks() {
+    /**
+     * Рендерит переданные записи и обновляет только их элементы.
+     * Без аргументов рендерит весь поток.
+     *
+     * @param {Object[]} [records]
+     * @returns {Promise}
+     */
+    updateBlocks(records) {
+        if (records === undefined) {
+            return this.renderStream({
+                allowedModels: this.allowedModels,
+                value: this.value,
+                limit: this._observer ? this.WINDOW_SIZE : null
+            });
+        }
+
         return this.renderStream({
             allowedModels: this.allowedModels,
-            value: this.value
+            value: records,
+            fragments: true
         });
     }
 
@@ -316,7 +426,39 @@ class StreamField {
                 return response.json();
             })
             .then(response => {
-                this.blocks.innerHTML = response.blocks;
+                if (response.fragments) {
+                    Object.entries(response.fragments).forEach(([uuid, html]) => {
+                        this._patchBlock(uuid, html);
+                    });
+                } else {
+                    this._renderWindow(response.blocks);
+                }
+            })
+            .catch(reason => {
+                if (reason instanceof Error) {
+                    // JS-ошибки дублируем в консоль
+                    console.error(reason);
+                }
+                modals.showErrors(reason);
+            });
+    }
+
+    /**
+     * Загружает блоки и кнопки поля вместе с остальными полями формы.
+     *
+     * @returns {Promise}
+     */
+    bootstrap() {
+        return bootstrapQueue
+            .add(this.field.dataset.bootstrapUrl, {
+                field_id: this.control.id,
+                allowedModels: this.allowedModels,
+                value: this.value,
+                limit: this._observer ? this.WINDOW_SIZE : null
+            })
+            .then(response => {
+                this._renderWindow(response.blocks);
+                this.buttons.innerHTML = response.buttons;
             })
             .catch(reason => {
                 if (reason instanceof Error) {
@@ -357,6 +499,73 @@ class StreamField {
     }
 }
 
+/**
+ * Собирает поля, инициализированные в одном цикле событий,
+ * и загружает их блоки и кнопки одним запросом.
+ */
+class BootstrapQueue {
+    constructor() {
+        this._batches = new Map();
+    }
+
+    /**
+     * @param {string} url
+     * @param {Object} field
+     * @returns {Promise}
+     */
+    add(url, field) {
+        let batch = this._batches.get(url);
+        if (!batch) {
+            batch = [];
+            this._batches.set(url, batch);
+            setTimeout(() => this._flush(url), 0);
+        }
+
+        return new Promise((resolve, reject) => {
+            batch.push({ field, resolve, reject });
+        });
+    }
+
+    /**
+     * @param {string} url
+     * @private
+     */
+    _flush(url) {
+        const batch = this._batches.get(url);
+        this._batches.delete(url);
+
+        fetch(url, {
+            method: "POST",
+            mode: "same-origin",
+            cache: "no-store",
+            headers: {
+                "Content-Type": "application/json;charset=utf-8"
+            },
+            body: JSON.stringify({
+                fields: batch.map(item => item.field)
+            })
+        })
+            .then(response => {
+                if (!response.ok) {
+                    throw `${response.status} ${response.statusText}`;
+                }
+                return response.json();
+            })
+            .then(data => {
+                batch.forEach(item => {
+                    item.resolve(data.fields[item.field.field_id]);
+                });
+            })
+            .catch(reason => {
+                batch.forEach(item => {
+                    item.reject(reason);
+                });
+            });
+    }
+}
+
+const bootstrapQueue = new BootstrapQueue();
+
 XClass.register("paper-streamfield", {
     init: function (element) {
         element._streamField = new StreamField(element, this);
@@ -394,14 +603,15 @@ function dismissAddStreamBlockPopup(originalFunc) {
             const field = control.closest(".stream-field");
             const streamField = field && field._streamField;
 
-            streamField._appendBlock({
+            const block = {
                 model: match.groups.blockModel,
                 pk: newId,
                 uuid: uuid4(),
                 visible: true
-            });
+            };
+            streamField._appendBlock(block);
 
-            streamField.wrapPreloader(streamField.updateBlocks());
+            streamField.wrapPreloader(streamField.updateBlocks([block]));
 
             popupUtils.removeRelatedWindow(win);
             win.close();
@@ -430,7 +640,7 @@ function dismissChangeStreamBlockPopup(originalFunc) {
             const field = fieldWrapper && fieldWrapper.firstElementChild;
             const instance = field && field._streamField;
 
-            instance.updateBlocks();
+            instance.updateBlocks([instance.getBlockByUUID(match.groups.uuid)]);
 
             popupUtils.removeRelatedWindow(win);
             win.close();
@@ -474,14 +684,15 @@ function dismissLookupStreamBlockPopup(originalFunc) {
             const field = control.closest(".stream-field");
             const streamField = field && field._streamField;
 
-            streamField._appendBlock({
+            const block = {
                 model: match.groups.blockModel,
                 pk: chosenId,
                 uuid: uuid4(),
                 visible: true
-            });
+            };
+            streamField._appendBlock(block);
 
-            streamField.wrapPreloader(streamField.updateBlocks());
+            streamField.wrapPreloader(streamField.updateBlocks([block]));
 
             popupUtils.removeRelatedWindow(win);
             win.close();
@@ -0,0 +1,64 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from .typing import BlockInstance, BlockModel
+
+_current_store: ContextVar[Optional["BlockStore"]] = ContextVar("streamfield_block_store", default=None)
+
+
+class BlockStore:
+    """
+    Block instances and rendered HTML shared by all streams
+    and blocks rendered within a request.
+
+    The HTML is stored only for cacheable blocks, since their output
+    depends on nothing but the values listed in `cache_vary_on`.
+    """
+
+    def __init__(self):
+        self.instances: dict[BlockModel, dict[Any, BlockInstance]] = defaultdict(dict)
+        self.outputs: dict[tuple[BlockModel, Any, Optional[str]], str] = {}
+
+
+def get_current_store() -> Optional[BlockStore]:
+    """
+    Get the block store of the current request, if any.
+    """
+    return _current_store.get()
+
+
+@contextmanager
+def block_store():
+    """
+    Share block instances and rendered HTML between all render calls
+    made within the block. Nested calls reuse the outer store.
+
+    Usage:
+        with block_store():
+            header = render_stream(page.header)
+            body = render_stream(page.stream)
+    """
+    store = _current_store.get()
+    if store is None:
+        store = BlockStore()
+
+    with use_store(store):
+        yield store
+
+
+@contextmanager
+def use_store(store: BlockStore):
+    """
+    Make the given store current for the duration of the block.
+    """
+    if _current_store.get() is store:
+        yield
+        return
+
+    token = _current_store.set(store)
+    try:
+        yield
+    finally:
+        _current_store.reset(token)
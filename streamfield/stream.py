@@ -0,0 +1,97 @@
+from typing import Any
+
+from django.apps import apps
+
+from .typing import BlockModel
+
+
+class StreamBlock(dict):
+    """
+    A record of a stream.
+
+    It is a regular dictionary, so it is JSON-serializable, but the block
+    model and the primary key of the block are resolved once and cached.
+    """
+
+    __slots__ = ("_model", "_pk")
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._reset()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._reset()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self._reset()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._reset()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._reset()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._reset()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._reset()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._reset()
+
+    def _reset(self):
+        for attr in self.__slots__:
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+    @property
+    def model(self) -> BlockModel:
+        """
+        Get the block model. Raises `LookupError` if it does not exist.
+        """
+        try:
+            return self._model
+        except AttributeError:
+            self._model = apps.get_model(self["model"])
+            return self._model
+
+    @property
+    def pk(self) -> Any:
+        """
+        Get the primary key of the block converted to the type
+        of the primary key field of the block model.
+        """
+        try:
+            return self._pk
+        except AttributeError:
+            self._pk = self.model._meta.pk.get_prep_value(self["pk"])
+            return self._pk
+
+
+class Stream(list):
+    """
+    The value of a `StreamField`: a list of `StreamBlock` records.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, records=()):
+        super().__init__(
+            StreamBlock(record) if isinstance(record, dict) and not isinstance(record, StreamBlock) else record
+            for record in records
+        )
@@ -14,20 +14,65 @@ register = Library()
 
 @register.simple_tag(name="render_stream", takes_context=True)
 def do_render_stream(context, stream: str, **kwargs):
-    ctx_dict = context.push(kwargs)
-    output = helpers.render_stream(stream, ctx_dict.context.flatten())
+    with context.push(**kwargs):
+        output = helpers.render_stream(stream, context.flatten())
     return mark_safe(output)
 
 
+@register.simple_tag(name="render_cached_stream", takes_context=True)
+def do_render_cached_stream(context, stream: str, *vary_on: str, **kwargs):
+    with context.push(**kwargs):
+        output = helpers.render_cached_stream(stream, context.flatten(), vary_on=vary_on)
+    return mark_safe(output)
+
+
+@register.simple_tag(name="render_streams", takes_context=True)
+def do_render_streams(context, objects, field_name: str = None, **kwargs):
+    """
+    Render many streams with a single query per block model.
+
+    With `field_name`, renders the given field of each object and returns
+    a list of `(object, html)` pairs. Otherwise `objects` is treated
+    as an iterable of streams and a list of HTML strings is returned.
+    """
+    with context.push(**kwargs):
+        flat_context = context.flatten()
+
+    if field_name is None:
+        outputs = helpers.render_streams(objects, flat_context)
+        return [mark_safe(output) for output in outputs]
+
+    return [
+        (obj, mark_safe(output))
+        for obj, output in helpers.render_object_streams(objects, field_name, flat_context)
+    ]
+
+
+@register.simple_tag(name="render_blocks", takes_context=True)
+def do_render_blocks(context, items, **kwargs):
+    """
+    Render many blocks, given as instances or `(model, pk)` references,
+    with a single query per block model. Returns a list of HTML strings.
+    """
+    with context.push(**kwargs):
+        outputs = helpers.render_blocks(items, context.flatten())
+    return [mark_safe(output) for output in outputs]
+
+
 @register.simple_tag(name="render_block", takes_context=True)
 def do_render_block(context, instance, **kwargs):
-    ctx_dict = context.push(kwargs)
+    with context.push(**kwargs):
+        flat_context = context.flatten()
+
     processor = blocks.get_processor(type(instance))
-    output = helpers.get_block_output(processor, instance, ctx_dict.context.flatten())
+    processor.prepare([instance], flat_context)
+    output = helpers.get_block_output(processor, instance, flat_context)
     return mark_safe(output)
 
 
 if jinja2 is not None:
+    from markupsafe import Markup
+
     class RenderStreamExtension(StandaloneTag):
         safe_output = True
         tags = {"render_stream"}
@@ -37,6 +82,39 @@ if jinja2 is not None:
             return helpers.render_stream(stream, context_vars)
 
 
+    class RenderCachedStreamExtension(StandaloneTag):
+        safe_output = True
+        tags = {"render_cached_stream"}
+
+        def render(self, stream: str, *vary_on: str, **kwargs):
+            context_vars = dict(self.context.get_all(), **kwargs)
+            return helpers.render_cached_stream(stream, context_vars, vary_on=vary_on)
+
+
+    class RenderStreamsExtension(StandaloneTag):
+        tags = {"render_streams"}
+
+        def render(self, objects, field_name: str = None, **kwargs):
+            context_vars = dict(self.context.get_all(), **kwargs)
+            if field_name is None:
+                outputs = helpers.render_streams(objects, context_vars)
+                return [Markup(output) for output in outputs]
+
+            return [
+                (obj, Markup(output))
+                for obj, output in helpers.render_object_streams(objects, field_name, context_vars)
+            ]
+
+
+    class RenderBlocksExtension(StandaloneTag):
+        tags = {"render_blocks"}
+
+        def render(self, items, **kwargs):
+            context_vars = dict(self.context.get_all(), **kwargs)
+            outputs = helpers.render_blocks(items, context_vars)
+            return [Markup(output) for output in outputs]
+
+
     class RenderBlockExtension(StandaloneTag):
         safe_output = True
         tags = {"render_block"}
@@ -44,6 +122,7 @@ if jinja2 is not None:
         def render(self, instance, **kwargs):
             context_vars = dict(self.context.get_all(), **kwargs)
             processor = blocks.get_processor(type(instance))
+            processor.prepare([instance], context_vars)
             return helpers.get_block_output(processor, instance, context_vars)
 
 
@@ -54,4 +133,7 @@ if jinja2 is not None:
         pass
     else:
         library.extension(RenderStreamExtension)
+        library.extension(RenderCachedStreamExtension)
+        library.extension(RenderStreamsExtension)
+        library.extension(RenderBlocksExtension)
         library.extension(RenderBlockExtension)
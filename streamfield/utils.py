@@ -5,3 +5,20 @@ re_camel_case = re.compile(r"(((?<=[a-z])[A-Z])|((?<!^)[A-Z](?![A-Z]|$)))")
 
 def camel_case_to_snake_case(value: str) -> str:
     return re_camel_case.sub(r"_\1", value).lower()
+
+
+def resolve_path(obj, path: str):
+    """
+    Resolve a dotted path of keys and attributes, starting from `obj`.
+    Returns `None` if any part of the path is missing.
+    """
+    for part in path.split("."):
+        if obj is None:
+            return None
+
+        if isinstance(obj, dict):
+            obj = obj.get(part)
+        else:
+            obj = getattr(obj, part, None)
+
+    return obj
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blocks', '0002_advantagesblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Icon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, verbose_name='name')),
+            ],
+            options={
+                'verbose_name': 'Icon',
+            },
+        ),
+        migrations.AddField(
+            model_name='advantagesblock',
+            name='icon',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='blocks.icon'),
+        ),
+        migrations.AddField(
+            model_name='headerblock',
+            name='icon',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='blocks.icon'),
+        ),
+    ]
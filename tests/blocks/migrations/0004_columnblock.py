@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import streamfield.field.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blocks', '0003_icon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColumnBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', streamfield.field.models.StreamField(default=list, verbose_name='stream')),
+            ],
+            options={
+                'verbose_name': 'Column',
+            },
+        ),
+    ]
@@ -3,9 +3,24 @@ from django.db import models
 from django.utils.text import Truncator
 from django.utils.translation import gettext_lazy as _
 
+from streamfield.field.models import StreamField
+
 from .processors import AdvantagesBlockProcessor
 
-__all__ = ["HeaderBlock", "TextBlock", "ImageBlock", "QuoteBlock", "AdvantagesBlock"]
+__all__ = ["Icon", "HeaderBlock", "TextBlock", "ImageBlock", "QuoteBlock", "AdvantagesBlock", "ColumnBlock"]
+
+
+class Icon(models.Model):
+    name = models.CharField(
+        _("name"),
+        max_length=64
+    )
+
+    class Meta:
+        verbose_name = "Icon"
+
+    def __str__(self):
+        return self.name
 
 
 class HeaderBlock(models.Model):
@@ -23,10 +38,19 @@ class HeaderBlock(models.Model):
                   "Headings with an equal or higher rank start a new section, headings with a lower rank start new "
                   "subsections that are part of the higher ranked section."
     )
+    icon = models.ForeignKey(
+        Icon,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True
+    )
 
     class Meta:
         verbose_name = "Header"
 
+    class StreamBlockMeta:
+        shared_related = ["icon"]
+
     def __str__(self):
         return self.text
 
@@ -90,6 +114,12 @@ class AdvantagesBlock(models.Model):
     header = models.TextField(
         _("header")
     )
+    icon = models.ForeignKey(
+        Icon,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True
+    )
 
     class Meta:
         verbose_name = "Advantages"
@@ -97,6 +127,23 @@ class AdvantagesBlock(models.Model):
     class StreamBlockMeta:
         template_name = "blocks/advantages.html"
         processor = AdvantagesBlockProcessor
+        shared_related = ["icon"]
 
     def __str__(self):
         return "Advantages Block"
+
+
+class ColumnBlock(models.Model):
+    stream = StreamField(
+        _("stream"),
+        models=[
+            "blocks.HeaderBlock",
+            "blocks.TextBlock",
+        ]
+    )
+
+    class Meta:
+        verbose_name = "Column"
+
+    def __str__(self):
+        return "Column Block"
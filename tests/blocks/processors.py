@@ -3,12 +3,16 @@ from streamfield import exceptions, processors
 
 
 class AdvantagesBlockProcessor(processors.DefaultProcessor):
+    def prepare(self, blocks, context=None, request=None):
+        advantages = list(Advantage.objects.all()[:3])
+        for block in blocks:
+            block.advantages = advantages
+
     def get_context(self, block):
         context = super().get_context(block)
 
-        advantages = Advantage.objects.all()[:3]
-        if len(advantages) < 3:
+        if len(block.advantages) < 3:
             raise exceptions.SkipBlock
 
-        context["advantages"] = advantages
+        context["advantages"] = block.advantages
         return context
@@ -0,0 +1,224 @@
+import json
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from blocks.admin import TextBlockAdmin
+from blocks.models import HeaderBlock, TextBlock
+from django.contrib import admin
+from django.urls import reverse
+
+from streamfield.local_cache import local_cache
+
+ALLOWED_MODELS = ["blocks.headerblock", "blocks.textblock"]
+
+
+def render_stream(client, stream, allowed_models=ALLOWED_MODELS, **kwargs):
+    response = client.post(
+        reverse("streamfields:render-stream"),
+        json.dumps(dict({
+            "allowedModels": allowed_models,
+            "value": stream,
+        }, **kwargs)),
+        content_type="application/json"
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def render_blocks(client, stream, allowed_models=ALLOWED_MODELS):
+    return render_stream(client, stream, allowed_models)["blocks"]
+
+
+@pytest.mark.django_db
+class TestRenderStreamView:
+    def test_order(self, admin_client):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        HeaderBlock.objects.create(pk=2, text="Second header")
+        TextBlock.objects.create(pk=1, text="Example text")
+
+        uuids = [str(uuid4()) for _ in range(6)]
+        stream = [
+            {"uuid": uuids[0], "model": "blocks.headerblock", "pk": "1"},
+            {"uuid": uuids[1], "model": "blocks.textblock", "pk": "1"},
+            {"uuid": uuids[2], "model": "blocks.headerblock", "pk": "42"},
+            {"uuid": uuids[3], "model": "blocks.quoteblock", "pk": "1"},
+            {"uuid": uuids[4], "model": "blocks.headerblock", "pk": "abc"},
+            {"uuid": uuids[5], "model": "blocks.headerblock", "pk": "2"},
+        ]
+
+        output = render_blocks(admin_client, stream)
+        positions = [output.index('data-uuid="%s"' % uuid) for uuid in uuids]
+        assert positions == sorted(positions)
+        assert output.count("Instance not found") == 2
+        assert output.count("The specified class is not allowed here") == 1
+        assert "First header" in output
+        assert "Second header" in output
+
+    def test_bulk_fetch(self, admin_client, django_assert_max_num_queries):
+        for pk in range(1, 11):
+            HeaderBlock.objects.create(pk=pk, text="Header")
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": str(pk)
+        } for pk in range(1, 11)]
+
+        render_blocks(admin_client, stream)
+        with django_assert_max_num_queries(3):
+            # session, user and blocks
+            render_blocks(admin_client, stream)
+
+    def test_model_permissions(self, admin_client):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        HeaderBlock.objects.create(pk=2, text="Second header")
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": str(pk)
+        } for pk in (1, 2)]
+
+        with patch.object(admin.ModelAdmin, "has_change_permission", autospec=True, return_value=True) as mock:
+            render_blocks(admin_client, stream)
+
+        assert [call.args[2:] for call in mock.call_args_list if call.args[0].model is HeaderBlock] == [()]
+
+    def test_object_permissions(self, admin_client):
+        TextBlock.objects.create(pk=1, text="First text")
+        TextBlock.objects.create(pk=2, text="Second text")
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": str(pk)
+        } for pk in (1, 2)]
+
+        def has_change_permission(self, request, obj=None):
+            return obj is not None and obj.pk == 1
+
+        with patch.object(TextBlockAdmin, "has_change_permission", has_change_permission, create=True):
+            output = render_blocks(admin_client, stream)
+
+        assert output.count("bi-pencil-square") == 1
+        assert output.count("bi-eye") == 1
+
+    def test_fragments(self, admin_client):
+        HeaderBlock.objects.create(pk=1, text="First header")
+
+        uuids = [str(uuid4()) for _ in range(2)]
+        stream = [
+            {"uuid": uuids[0], "model": "blocks.headerblock", "pk": "1"},
+            {"uuid": uuids[1], "model": "blocks.headerblock", "pk": "2"},
+        ]
+
+        fragments = render_stream(admin_client, stream, fragments=True)["fragments"]
+        assert list(fragments) == uuids
+        assert "First header" in fragments[uuids[0]]
+        assert "Instance not found" in fragments[uuids[1]]
+
+    def test_window(self, admin_client):
+        for pk in range(1, 6):
+            HeaderBlock.objects.create(pk=pk, text="Header #%d" % pk)
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": str(pk)
+        } for pk in range(1, 6)]
+
+        output = render_stream(admin_client, stream, offset=1, limit=2)["blocks"]
+        assert "Header #1" not in output
+        assert "Header #2" in output
+        assert "Header #3" in output
+        assert "Header #4" not in output
+
+    def test_utf8_response(self, admin_client, settings):
+        settings.DEFAULT_CHARSET = "cp1251"
+        HeaderBlock.objects.create(pk=1, text="Заголовок")
+
+        response = admin_client.post(
+            reverse("streamfields:render-stream"),
+            json.dumps({
+                "allowedModels": ALLOWED_MODELS,
+                "value": [{"uuid": str(uuid4()), "model": "blocks.headerblock", "pk": "1"}]
+            }),
+            content_type="application/json"
+        )
+        assert response["Content-Type"] == "application/json; charset=utf-8"
+        assert "Заголовок" in json.loads(response.content.decode("utf-8"))["blocks"]
+
+    def test_invalid_window(self, admin_client):
+        response = admin_client.post(
+            reverse("streamfields:render-stream"),
+            json.dumps({
+                "allowedModels": ALLOWED_MODELS,
+                "value": [],
+                "limit": -1
+            }),
+            content_type="application/json"
+        )
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestBootstrapView:
+    @pytest.fixture(autouse=True)
+    def clear_local_cache(self):
+        local_cache.clear()
+        yield
+        local_cache.clear()
+
+    def bootstrap(self, client, fields):
+        return client.post(
+            reverse("streamfields:bootstrap"),
+            json.dumps({
+                "fields": fields
+            }),
+            content_type="application/json"
+        )
+
+    def test_rendering(self, admin_client, django_assert_max_num_queries):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        HeaderBlock.objects.create(pk=2, text="Second header")
+
+        fields = [{
+            "field_id": "id_stream",
+            "allowedModels": ALLOWED_MODELS,
+            "value": [{"uuid": str(uuid4()), "model": "blocks.headerblock", "pk": "1"}]
+        }, {
+            "field_id": "id_another_stream",
+            "allowedModels": ["blocks.headerblock"],
+            "value": [{"uuid": str(uuid4()), "model": "blocks.headerblock", "pk": "2"}]
+        }]
+
+        self.bootstrap(admin_client, fields)
+        with django_assert_max_num_queries(3):
+            # session, user and blocks of both fields
+            response = self.bootstrap(admin_client, fields)
+
+        data = response.json()["fields"]
+        assert "First header" in data["id_stream"]["blocks"]
+        assert "Second header" in data["id_another_stream"]["blocks"]
+        assert 'id="streamfield:add_id_stream--blocks.textblock"' in data["id_stream"]["buttons"]
+        assert 'id="streamfield:add_id_another_stream--blocks.headerblock"' in data["id_another_stream"]["buttons"]
+        assert "blocks.textblock" not in data["id_another_stream"]["buttons"]
+
+    def test_buttons_cache(self, admin_client):
+        fields = [{
+            "field_id": "id_stream",
+            "allowedModels": ALLOWED_MODELS,
+            "value": []
+        }]
+
+        self.bootstrap(admin_client, fields)
+        with patch.object(admin.ModelAdmin, "has_add_permission", autospec=True, return_value=True) as mock:
+            response = self.bootstrap(admin_client, fields)
+
+        assert mock.call_count == 0
+        assert "blocks.headerblock" in response.json()["fields"]["id_stream"]["buttons"]
+
+    def test_invalid_data(self, admin_client):
+        response = self.bootstrap(admin_client, [{"field_id": "id_stream"}])
+        assert response.status_code == 400
@@ -82,3 +82,16 @@ class TestGetProcessor:
     def test_processor_options(self):
         processor = blocks.get_processor(TextBlock)
         assert processor.get_template_names(get_mock()) == "blocks/text.html"
+
+    def test_processor_reused(self):
+        assert blocks.get_processor(HeaderBlock) is blocks.get_processor(HeaderBlock)
+
+
+class TestGetBlockModels:
+    def test_block_models(self):
+        assert blocks.get_block_models() == {
+            HeaderBlock,
+            ImageBlock,
+            TextBlock,
+            AdvantagesBlock,
+        }
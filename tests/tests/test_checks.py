@@ -0,0 +1,27 @@
+from unittest.mock import patch
+
+from blocks.models import HeaderBlock, TextBlock
+
+from streamfield import checks
+
+
+class TestBlockProcessorsCheck:
+    def test_valid_configuration(self):
+        assert checks.check_block_processors() == []
+
+    def test_invalid_processor(self):
+        with patch.object(TextBlock.StreamBlockMeta, "processor", "unknown.Processor", create=True):
+            errors = checks.check_block_processors()
+
+        assert [error.id for error in errors] == ["streamfield.E001"]
+        assert errors[0].obj is TextBlock
+
+    def test_missing_template(self):
+        class StreamBlockMeta:
+            template_name = "blocks/missing.html"
+
+        with patch.object(HeaderBlock, "StreamBlockMeta", StreamBlockMeta, create=True):
+            errors = checks.check_block_processors()
+
+        assert [error.id for error in errors] == ["streamfield.W001"]
+        assert errors[0].obj is HeaderBlock
@@ -0,0 +1,131 @@
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+import pytest
+from blocks.models import ColumnBlock, HeaderBlock, TextBlock
+from django.template import engines
+from django.test import RequestFactory
+
+from streamfield import blocks, helpers
+from streamfield.context import BlockContext, flatten_context
+from streamfield.processors import DefaultProcessor
+
+
+class TestBlockContext:
+    def test_parent_context(self):
+        context = BlockContext({"theme": "dark"})
+        with context.push({"block": "first"}):
+            assert context["theme"] == "dark"
+            assert context["block"] == "first"
+
+        assert "block" not in context
+        assert dict(context) == {
+            "True": True,
+            "False": False,
+            "None": None,
+            "theme": "dark",
+        }
+
+    def test_processors_run_once(self):
+        processor = Mock(return_value={"user": "admin"})
+        engine = Mock(template_context_processors=(processor,), autoescape=True)
+        context = BlockContext({"theme": "dark"}, request=RequestFactory().get("/"))
+
+        for _ in range(3):
+            with context.bind_template(Mock(engine=engine)):
+                assert context["user"] == "admin"
+
+        assert "user" not in context
+        assert processor.call_count == 1
+
+    def test_parent_context_overrides_processors(self):
+        processor = Mock(return_value={"theme": "light"})
+        engine = Mock(template_context_processors=(processor,), autoescape=True)
+        context = BlockContext({"theme": "dark"}, request=RequestFactory().get("/"))
+
+        with context.bind_template(Mock(engine=engine)):
+            assert context["theme"] == "dark"
+
+    def test_flatten_context(self):
+        assert flatten_context(None) == {}
+        assert flatten_context({"theme": "dark"}) == {"theme": "dark"}
+        assert flatten_context(BlockContext({"theme": "dark"}))["theme"] == "dark"
+
+
+@pytest.mark.django_db
+class TestLayeredRendering:
+    @pytest.fixture(autouse=True)
+    def django_engine(self):
+        with patch.object(DefaultProcessor, "template_engine", "django"):
+            yield
+
+    def test_rendering(self):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+        TextBlock.objects.create(pk=1, text="Dark text")
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": "1"
+        }]
+        output = helpers.render_stream(stream, {"theme": "dark"})
+        assert output == (
+            '<h1 class="header--dark">Example header</h1>\n'
+            '<div class="text--dark"><p>Dark text</p></div>'
+        )
+
+    def test_processors_run_once_per_stream(self):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        HeaderBlock.objects.create(pk=2, text="Second header")
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": str(pk)
+        } for pk in (1, 2)]
+
+        engine = engines["django"].engine
+        processor = Mock(return_value={"theme": "dark"})
+        with patch.object(engine, "template_context_processors", (processor,)):
+            output = helpers.render_stream(stream, request=RequestFactory().get("/"))
+
+        assert output == (
+            '<h1 class="header--dark">First header</h1>\n'
+            '<h1 class="header--dark">Second header</h1>'
+        )
+        assert processor.call_count == 1
+
+    def test_container_context_does_not_leak(self):
+        TextBlock.objects.create(pk=1, text="Nested text")
+        HeaderBlock.objects.create(pk=1, text="Sibling header")
+        ColumnBlock.objects.create(pk=1, stream=[{
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": "1"
+        }])
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.columnblock",
+            "pk": "1"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }]
+
+        column_processor = blocks.get_processor(ColumnBlock)
+        header_processor = blocks.get_processor(HeaderBlock)
+        sibling_template = engines["django"].from_string("[{{ secret }}]")
+        with patch.object(column_processor, "get_context", lambda block: {"block": block, "secret": "LEAK"}), \
+                patch.object(header_processor, "get_template", return_value=sibling_template):
+            output = helpers.render_stream(stream)
+
+        assert output == (
+            '<div class="column"><div><p>Nested text</p></div></div>\n'
+            '[]'
+        )
@@ -1,9 +1,15 @@
+from unittest.mock import Mock, patch
 from uuid import uuid4
 
 import pytest
-from blocks.models import HeaderBlock, TextBlock
+from asgiref.sync import async_to_sync
+from blocks.models import AdvantagesBlock, ColumnBlock, HeaderBlock, Icon, TextBlock
+from django.core.cache import cache
 
-from streamfield import exceptions, helpers
+from streamfield import blocks, exceptions, helpers
+from streamfield.local_cache import local_cache
+from streamfield.processors import BaseProcessor, DefaultProcessor
+from streamfield.renderer import StreamRenderer
 
 
 @pytest.mark.django_db
@@ -122,6 +128,382 @@ class TestRenderStream:
         output = helpers.render_stream(stream)
         assert output == "<h1>Example header</h1>\n<div><p>Another text</p></div>"
 
+    def test_prepare(self, django_assert_num_queries):
+        AdvantagesBlock.objects.create(pk=1)
+        AdvantagesBlock.objects.create(pk=2)
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.advantagesblock",
+            "pk": str(pk)
+        } for pk in (1, 2)]
+
+        processor = blocks.get_processor(AdvantagesBlock)
+        with patch.object(processor, "prepare", wraps=processor.prepare) as prepare:
+            # one query for the blocks and one for the advantages
+            with django_assert_num_queries(2):
+                helpers.render_stream(stream)
+
+        prepare.assert_called_once()
+        assert sorted(block.pk for block in prepare.call_args.args[0]) == [1, 2]
+
+    def test_shared_related(self, django_assert_num_queries):
+        icon = Icon.objects.create(pk=1, name="star")
+        HeaderBlock.objects.create(pk=1, text="Example header", icon=icon)
+        HeaderBlock.objects.create(pk=2, text="Another header")
+        AdvantagesBlock.objects.create(pk=1, icon=icon)
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "2"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.advantagesblock",
+            "pk": "1"
+        }]
+
+        renderer = StreamRenderer()
+        renderer.add(helpers.parse_stream(stream))
+        renderer.fetch()
+
+        # one query for the icons of all block models and one for the advantages
+        with django_assert_num_queries(2):
+            renderer.prepare()
+
+        with django_assert_num_queries(0):
+            assert renderer.instances[HeaderBlock][1].icon == icon
+            assert renderer.instances[HeaderBlock][2].icon is None
+            assert renderer.instances[AdvantagesBlock][1].icon == icon
+
+
+@pytest.mark.django_db
+class TestIterRenderStream:
+    stream = [{
+        "uuid": str(uuid4()),
+        "model": "blocks.headerblock",
+        "pk": "1"
+    }, {
+        "uuid": str(uuid4()),
+        "model": "blocks.textblock",
+        "pk": "1"
+    }, {
+        "uuid": str(uuid4()),
+        "model": "blocks.headerblock",
+        "pk": "2"
+    }]
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="First header"
+        )
+        HeaderBlock.objects.create(
+            pk=2,
+            text="Second header"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+    def test_rendering(self):
+        assert list(helpers.iter_render_stream(self.stream)) == [
+            "<h1>First header</h1>",
+            "<div><p>Example text</p></div>",
+            "<h1>Second header</h1>",
+        ]
+
+    def test_lazy_fetching(self, django_assert_num_queries):
+        iterator = helpers.iter_render_stream(self.stream, lazy=True)
+
+        with django_assert_num_queries(1):
+            assert next(iterator) == "<h1>First header</h1>"
+
+        with django_assert_num_queries(1):
+            assert next(iterator) == "<div><p>Example text</p></div>"
+
+        with django_assert_num_queries(0):
+            assert next(iterator) == "<h1>Second header</h1>"
+
+
+@pytest.mark.django_db
+class TestAsyncRenderStream:
+    def test_rendering(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": "1",
+            "visible": False
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": "1"
+        }]
+
+        output = async_to_sync(helpers.arender_stream)(stream, {
+            "theme": "dark"
+        })
+        assert output == '<h1 class="header--dark">Example header</h1>\n<div class="text--dark"><p>Example text</p></div>'
+
+    def test_skip_block(self):
+        AdvantagesBlock.objects.create(
+            pk=1,
+            header="Advantages"
+        )
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.advantagesblock",
+            "pk": "1"
+        }]
+
+        output = async_to_sync(helpers.arender_stream)(stream)
+        assert output == ""
+
+
+def get_versioned_cache_key(model, pk):
+    processor = blocks.get_processor(model)
+    return processor.get_versioned_cache_key(
+        processor.get_pk_cache_key(pk),
+        processor.get_cache_generation()
+    )
+
+
+@pytest.mark.django_db
+class TestStreamCaching:
+    stream = [{
+        "uuid": str(uuid4()),
+        "model": "blocks.headerblock",
+        "pk": "1"
+    }, {
+        "uuid": str(uuid4()),
+        "model": "blocks.textblock",
+        "pk": "1"
+    }]
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+        cache.clear()
+        with patch.object(DefaultProcessor, "cache", True):
+            yield
+        cache.clear()
+
+    def test_single_round_trip(self):
+        with patch.object(cache, "get_many", wraps=cache.get_many) as get_many, \
+                patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+            output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+        assert get_many.call_count == 2  # generations + blocks
+        assert set_many.call_count == 1
+        assert len(cache.get_many([
+            get_versioned_cache_key(HeaderBlock, 1),
+            get_versioned_cache_key(TextBlock, 1)
+        ])) == 2
+
+    def test_cached_output(self):
+        helpers.render_stream(self.stream)
+        HeaderBlock.objects.filter(pk=1).update(text="Changed header")
+
+        with patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+            output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+        assert set_many.call_count == 0
+
+    def test_no_queries_for_cached_blocks(self, django_assert_num_queries):
+        helpers.render_stream(self.stream)
+
+        with django_assert_num_queries(0):
+            output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+
+    def test_fetch_only_missing_blocks(self, django_assert_num_queries):
+        helpers.render_stream(self.stream)
+        cache.delete(get_versioned_cache_key(TextBlock, 1))
+
+        with django_assert_num_queries(1):
+            output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+
+    def test_cache_vary_on(self):
+        with patch.object(DefaultProcessor, "cache_vary_on", ["theme"]):
+            dark_output = helpers.render_stream(self.stream, {
+                "theme": "dark"
+            })
+            light_output = helpers.render_stream(self.stream, {
+                "theme": "light"
+            })
+
+        assert dark_output == '<h1 class="header--dark">Example header</h1>\n<div class="text--dark"><p>Example text</p></div>'
+        assert light_output == '<h1 class="header--light">Example header</h1>\n<div class="text--light"><p>Example text</p></div>'
+
+    def test_stale_while_revalidate(self):
+        with patch.object(DefaultProcessor, "cache_stale_ttl", 60):
+            cache_key = get_versioned_cache_key(HeaderBlock, 1)
+            cache.set(cache_key, ("<h1>Stale header</h1>", 0))
+
+            # another worker is refreshing the block
+            cache.add(cache_key + ":lock", 1)
+            output = helpers.render_stream(self.stream)
+            assert output == "<h1>Stale header</h1>\n<div><p>Example text</p></div>"
+
+            cache.delete(cache_key + ":lock")
+            output = helpers.render_stream(self.stream)
+            assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+            assert cache_key + ":lock" not in cache
+
+    def test_render_override(self):
+        processor = blocks.get_processor(HeaderBlock)
+        with patch.object(processor, "render", return_value="<h1>Overridden</h1>"):
+            output = helpers.render_stream(self.stream)
+            assert output == "<h1>Overridden</h1>\n<div><p>Example text</p></div>"
+
+            output = helpers.render_stream(self.stream)
+            assert output == "<h1>Overridden</h1>\n<div><p>Example text</p></div>"
+
+    def test_cache_key_override(self, django_assert_num_queries):
+        processor = blocks.get_processor(HeaderBlock)
+        with patch.object(processor, "get_cache_key", lambda block: "header:%s" % block.pk):
+            helpers.render_stream(self.stream)
+            HeaderBlock.objects.filter(pk=1).update(text="Changed header")
+
+            with django_assert_num_queries(1):
+                output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+        assert cache.get(
+            processor.get_versioned_cache_key("header:1", processor.get_cache_generation())
+        ) == "<h1>Example header</h1>"
+
+    def test_local_cache(self):
+        local_cache.clear()
+        with patch.object(DefaultProcessor, "cache_local", True):
+            helpers.render_stream(self.stream)
+
+            with patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+                output = helpers.render_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>\n<div><p>Example text</p></div>"
+        assert get_many.call_count == 1  # generations only
+        local_cache.clear()
+
+
+@pytest.mark.django_db
+class TestRenderCachedStream:
+    stream = [{
+        "uuid": str(uuid4()),
+        "model": "blocks.headerblock",
+        "pk": "1"
+    }, {
+        "uuid": str(uuid4()),
+        "model": "blocks.textblock",
+        "pk": "1",
+        "visible": False
+    }]
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+
+        cache.clear()
+        yield
+        cache.clear()
+
+    def test_cache_hit(self, django_assert_num_queries):
+        assert helpers.render_cached_stream(self.stream) == "<h1>Example header</h1>"
+
+        with patch.object(helpers, "parse_stream") as parse_stream, \
+                django_assert_num_queries(0):
+            output = helpers.render_cached_stream(self.stream)
+
+        assert output == "<h1>Example header</h1>"
+        assert parse_stream.call_count == 0
+
+    def test_stream_cache_key(self):
+        same_stream = [dict(record, uuid=str(uuid4())) for record in self.stream]
+        assert helpers.get_stream_cache_key(self.stream) == helpers.get_stream_cache_key(same_stream)
+
+        assert helpers.get_stream_cache_key(self.stream, ["theme"], {
+            "theme": "dark"
+        }) != helpers.get_stream_cache_key(self.stream, ["theme"], {
+            "theme": "light"
+        })
+
+    def test_invalidation(self):
+        assert helpers.render_cached_stream(self.stream) == "<h1>Example header</h1>"
+
+        block = HeaderBlock.objects.get(pk=1)
+        block.text = "Changed header"
+        block.save()
+
+        assert helpers.render_cached_stream(self.stream) == "<h1>Changed header</h1>"
+
+    def test_custom_processor(self):
+        class HeaderProcessor(BaseProcessor):
+            def get_queryset(self):
+                return self.model._default_manager.all()
+
+            def render(self, block, context=None, request=None):
+                return "<h2>%s</h2>" % block.text
+
+        processor = HeaderProcessor(app_label="blocks", model_name="HeaderBlock")
+        with patch.dict(blocks._processors, {HeaderBlock: processor}):
+            assert helpers.render_cached_stream(self.stream) == "<h2>Example header</h2>"
+            assert helpers.render_cached_stream(self.stream) == "<h2>Example header</h2>"
+
+    def test_nested_invalidation(self):
+        ColumnBlock.objects.create(pk=1, stream=[{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }])
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.columnblock",
+            "pk": "1"
+        }]
+        assert helpers.render_cached_stream(stream) == '<div class="column"><h1>Example header</h1></div>'
+
+        block = HeaderBlock.objects.get(pk=1)
+        block.text = "Changed header"
+        block.save()
+
+        assert helpers.render_cached_stream(stream) == '<div class="column"><h1>Changed header</h1></div>'
+
 
 @pytest.mark.django_db
 class TestRenderBlock:
@@ -150,3 +532,163 @@ class TestRenderBlock:
             "theme": "dark"
         })
         assert output == '<div class="text--dark"><p>Dark text</p></div>'
+
+
+@pytest.mark.django_db
+class TestNestedStreams:
+    def test_rendering(self, django_assert_num_queries):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        HeaderBlock.objects.create(pk=2, text="Second header")
+        TextBlock.objects.create(pk=1, text="Example text")
+
+        for pk in (1, 2):
+            ColumnBlock.objects.create(pk=pk, stream=[{
+                "uuid": str(uuid4()),
+                "model": "blocks.headerblock",
+                "pk": str(pk)
+            }, {
+                "uuid": str(uuid4()),
+                "model": "blocks.textblock",
+                "pk": "1"
+            }])
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.columnblock",
+            "pk": str(pk)
+        } for pk in (1, 2)]
+
+        # one query for the columns and one per model of the nested blocks
+        with django_assert_num_queries(3):
+            output = helpers.render_stream(stream)
+
+        assert output == (
+            '<div class="column"><h1>First header</h1>\n<div><p>Example text</p></div></div>\n'
+            '<div class="column"><h1>Second header</h1>\n<div><p>Example text</p></div></div>'
+        )
+
+    def test_async_rendering(self, django_assert_num_queries):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+        ColumnBlock.objects.create(pk=1, stream=[{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }])
+
+        stream = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.columnblock",
+            "pk": "1"
+        }]
+
+        with django_assert_num_queries(2):
+            output = async_to_sync(helpers.arender_stream)(stream)
+
+        assert output == '<div class="column"><h1>Example header</h1></div>'
+
+
+@pytest.mark.django_db
+class TestRenderBlocks:
+    def test_rendering(self, django_assert_num_queries):
+        header_block = HeaderBlock.objects.create(
+            pk=1,
+            text="First header"
+        )
+        HeaderBlock.objects.create(
+            pk=2,
+            text="Second header"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+        items = [
+            ("blocks.textblock", 1),
+            header_block,
+            (HeaderBlock, 2),
+            ("blocks.textblock", 42),
+        ]
+        with django_assert_num_queries(2):
+            outputs = helpers.render_blocks(items)
+
+        assert outputs == [
+            "<div><p>Example text</p></div>",
+            "<h1>First header</h1>",
+            "<h1>Second header</h1>",
+            "",
+        ]
+
+    def test_invalid_items(self, caplog):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="First header"
+        )
+
+        items = [
+            ("blocks.unknownblock", 1),
+            ("blocks.headerblock", 1),
+            ("blocks.headerblock", 42),
+        ]
+        with caplog.at_level("WARNING", logger="streamfield"):
+            outputs = helpers.render_blocks(items)
+
+        assert outputs == ["", "<h1>First header</h1>", ""]
+        assert "Invalid block: ('blocks.unknownblock', 1)" in caplog.text
+        assert "'model': 'blocks.headerblock', 'pk': 42" in caplog.text
+
+
+@pytest.mark.django_db
+class TestRenderStreams:
+    def test_rendering(self, django_assert_num_queries):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="First header"
+        )
+        HeaderBlock.objects.create(
+            pk=2,
+            text="Second header"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+        streams = [[{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1"
+        }, {
+            "uuid": str(uuid4()),
+            "model": "blocks.textblock",
+            "pk": "1"
+        }], [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "2"
+        }], []]
+
+        with django_assert_num_queries(2):
+            outputs = helpers.render_streams(streams)
+
+        assert outputs == [
+            "<h1>First header</h1>\n<div><p>Example text</p></div>",
+            "<h1>Second header</h1>",
+            ""
+        ]
+
+    def test_object_streams(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+
+        pages = [
+            Mock(stream='[{"uuid": "%s", "model": "blocks.headerblock", "pk": "1"}]' % uuid4()),
+            Mock(stream=[]),
+        ]
+
+        assert helpers.render_object_streams(pages, "stream") == [
+            (pages[0], "<h1>Example header</h1>"),
+            (pages[1], ""),
+        ]
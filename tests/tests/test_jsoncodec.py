@@ -0,0 +1,84 @@
+import json
+import sys
+from unittest.mock import patch
+
+import pytest
+from blocks.models import ColumnBlock, HeaderBlock
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.forms.fields import InvalidJSONInput
+
+from streamfield import jsoncodec
+from streamfield.field.forms import StreamField
+from streamfield.stream import Stream
+
+
+@pytest.mark.parametrize("name", ["auto", "orjson", "json"])
+class TestCodec:
+    def test_round_trip(self, name):
+        loads, dumps, dumps_bytes = jsoncodec.get_codec(name)
+        data = [{"uuid": "1", "model": "blocks.headerblock", "pk": "1", "text": "Привет"}]
+        assert loads(dumps(data)) == data
+        assert loads(dumps_bytes(data)) == data
+        assert dumps_bytes(data).decode() == dumps(data)
+        assert "Привет" in dumps(data)
+
+    def test_invalid_input(self, name):
+        loads, dumps, dumps_bytes = jsoncodec.get_codec(name)
+        with pytest.raises(json.JSONDecodeError):
+            loads("[{")
+
+    def test_unsupported_type_fallback(self, name):
+        loads, dumps, dumps_bytes = jsoncodec.get_codec(name)
+
+        class Items(tuple):
+            pass
+
+        assert loads(dumps({"items": Items((1, 2))})) == {"items": [1, 2]}
+
+
+def test_auto_fallback():
+    with patch.dict(sys.modules, {"orjson": None, "msgspec": None}):
+        loads, dumps, dumps_bytes = jsoncodec.get_codec("auto")
+    assert dumps([1]) == json.dumps([1])
+
+
+def test_missing_codec():
+    with patch.dict(sys.modules, {"msgspec": None}):
+        with pytest.raises(ImproperlyConfigured):
+            jsoncodec.get_codec("msgspec")
+
+
+def test_unknown_codec():
+    with pytest.raises(ImproperlyConfigured):
+        jsoncodec.get_codec("yaml")
+
+
+class TestFormField:
+    def test_to_python(self):
+        field = StreamField()
+        assert field.to_python('[{"model": "blocks.headerblock", "pk": 1}]') == [
+            {"model": "blocks.headerblock", "pk": 1}
+        ]
+        assert field.to_python("") is None
+
+        with pytest.raises(ValidationError):
+            field.to_python("[{")
+
+    def test_bound_data(self):
+        field = StreamField()
+        assert field.bound_data("[]", None) == []
+        assert isinstance(field.bound_data("[{", None), InvalidJSONInput)
+
+    def test_prepare_value(self):
+        field = StreamField()
+        assert json.loads(field.prepare_value([{"pk": 1}])) == [{"pk": 1}]
+        assert field.prepare_value(InvalidJSONInput("[{")) == "[{"
+
+
+@pytest.mark.django_db
+def test_model_field():
+    ColumnBlock.objects.create(pk=1, stream=[{"uuid": "1", "model": "blocks.headerblock", "pk": "1"}])
+
+    column = ColumnBlock.objects.get(pk=1)
+    assert isinstance(column.stream, Stream)
+    assert column.stream[0].model is HeaderBlock
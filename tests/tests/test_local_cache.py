@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+from streamfield.local_cache import LocalCache, get_size
+
+
+class TestLocalCache:
+    def test_get_set(self):
+        cache = LocalCache(max_size=1024 * 1024)
+        cache.set("key", "value", 60)
+        assert cache.get("key") == "value"
+        assert cache.get("missing") is None
+        assert "key" in cache
+
+    def test_get_many(self):
+        cache = LocalCache(max_size=1024 * 1024)
+        cache.set_many({
+            "first": "1",
+            "second": "2",
+        }, 60)
+        assert cache.get_many(["first", "second", "third"]) == {
+            "first": "1",
+            "second": "2",
+        }
+
+    def test_expiration(self):
+        cache = LocalCache(max_size=1024 * 1024)
+        with patch("time.monotonic", return_value=1000):
+            cache.set("key", "value", 60)
+
+        with patch("time.monotonic", return_value=1059):
+            assert cache.get("key") == "value"
+
+        with patch("time.monotonic", return_value=1060):
+            assert cache.get("key") is None
+
+        assert cache.size == 0
+
+    def test_size_limit(self):
+        entry_size = get_size("key1") + get_size("x" * 100)
+        cache = LocalCache(max_size=entry_size * 2)
+
+        cache.set("key1", "x" * 100, 60)
+        cache.set("key2", "x" * 100, 60)
+        cache.get("key1")  # mark as recently used
+        cache.set("key3", "x" * 100, 60)
+
+        assert "key1" in cache
+        assert "key2" not in cache
+        assert "key3" in cache
+        assert cache.size <= cache.max_size
+
+    def test_oversized_entry(self):
+        cache = LocalCache(max_size=64)
+        cache.set("key", "x" * 1000, 60)
+        assert "key" not in cache
+        assert cache.size == 0
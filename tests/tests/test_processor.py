@@ -1,9 +1,13 @@
+from pathlib import Path
+
 import pytest
 from blocks.models import *
 from django.core.cache import cache
+from django.db.models import F
 from django.template.exceptions import TemplateDoesNotExist
 
-from streamfield.processors import DefaultProcessor
+from streamfield import signals
+from streamfield.processors import DefaultProcessor, clear_template_cache, template_cache
 
 from .mock import get_mock
 
@@ -76,6 +80,47 @@ class TestQueryset:
             "authors": {},
         }
 
+    def test_prefetch_related(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            prefetch_related=["reviews", "authors"]
+        )
+        queryset = processor.get_queryset()
+        assert queryset._prefetch_related_lookups == ("reviews", "authors")
+
+    def test_only(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            only="text"
+        )
+        queryset = processor.get_queryset()
+        assert queryset.query.deferred_loading == ({"text"}, False)
+
+    def test_defer(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            defer=["text"]
+        )
+        queryset = processor.get_queryset()
+        assert queryset.query.deferred_loading == ({"text"}, True)
+
+    @pytest.mark.django_db
+    def test_annotate(self):
+        HeaderBlock.objects.create(pk=1, text="Example header", rank=2)
+
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            annotate={
+                "next_rank": F("rank") + 1
+            }
+        )
+        blocks = processor.get_queryset().in_bulk([1])
+        assert blocks[1].next_rank == 3
+
 
 class TestRendering:
     def test_default_template_names(self):
@@ -101,6 +146,53 @@ class TestRendering:
         with pytest.raises(TemplateDoesNotExist, match="unknown/headerblock.html, unknown/header_block.html"):
             processor.render(block)
 
+    def test_template_cache(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+
+        template = processor.get_template(get_mock())
+        assert processor.get_template(get_mock()) is template
+
+        clear_template_cache()
+        assert processor.get_template(get_mock()) is not template
+
+    def test_template_cache_autoreload(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+
+        processor.get_template(get_mock())
+        assert template_cache
+
+        signals.handle_file_changed(None, file_path=Path("blocks/header_block.html"))
+        assert not template_cache
+
+    def test_template_cache_setting_changed(self, settings):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+
+        processor.get_template(get_mock())
+        assert template_cache
+
+        settings.TEMPLATES = settings.TEMPLATES[::-1]
+        assert not template_cache
+
+    def test_template_cache_debug(self, settings):
+        clear_template_cache()
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+
+        settings.DEBUG = True
+        processor.get_template(get_mock())
+        assert not template_cache
+
     def test_default_context(self):
         processor = DefaultProcessor(
             app_label="blocks",
@@ -155,6 +247,49 @@ class TestCaching:
         )
         assert processor.get_cache_key(block) == "blocks.HeaderBlock:26"
 
+    def test_pk_cache_key(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+        assert processor.get_pk_cache_key(26) == "blocks.HeaderBlock:26"
+
+    def test_cache_vary_key(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            cache_vary_on=["theme", "request.user.pk", "language"]
+        )
+
+        assert processor.get_cache_vary_key({
+            "theme": "dark"
+        }) == processor.get_cache_vary_key({
+            "theme": "dark",
+            "other": "ignored"
+        })
+
+        assert processor.get_cache_vary_key({
+            "theme": "dark"
+        }) != processor.get_cache_vary_key({
+            "theme": "light"
+        })
+
+        request = get_mock(spec=["user"], user=get_mock(spec=["pk"], pk=1))
+        assert processor.get_cache_vary_key({
+            "theme": "dark"
+        }) != processor.get_cache_vary_key({
+            "theme": "dark"
+        }, request=request)
+
+    def test_no_cache_vary_key(self):
+        processor = DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+        )
+        assert processor.get_cache_vary_key({
+            "theme": "dark"
+        }) is None
+
     def test_default_cache_ttl(self):
         processor = DefaultProcessor(
             app_label="blocks",
@@ -179,7 +314,10 @@ class TestCaching:
         )
 
         # clear cache
-        cache_key = processor.get_cache_key(block)
+        cache_key = processor.get_versioned_cache_key(
+            processor.get_cache_key(block),
+            processor.get_cache_generation()
+        )
         if cache_key in cache:
             cache.delete(cache_key)
 
@@ -194,6 +332,69 @@ class TestCaching:
         assert processor.render(same_block) == "<h2>Hello world</h2>"
 
         # clear cache
-        cache_key = processor.get_cache_key(block)
         if cache_key in cache:
             cache.delete(cache_key)
+
+
+@pytest.mark.django_db
+class TestStaleCache:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        yield
+        cache.clear()
+
+    def get_processor(self, **kwargs):
+        return DefaultProcessor(
+            app_label="blocks",
+            model_name="HeaderBlock",
+            cache=True,
+            **kwargs
+        )
+
+    def get_block(self, text="Fresh header"):
+        return get_mock(
+            spec=["pk", "rank", "text"],
+            pk="26",
+            rank="2",
+            text=text,
+        )
+
+    def get_cache_key(self, processor, block):
+        return processor.get_versioned_cache_key(
+            processor.get_cache_key(block),
+            processor.get_cache_generation()
+        )
+
+    def test_cache_entry(self):
+        processor = self.get_processor(cache_stale_ttl=60)
+        value, timeout = processor.make_cache_entry("<h2>Header</h2>", 3600)
+        assert timeout == 3660
+        assert processor.parse_cache_entry(value) == ("<h2>Header</h2>", False)
+
+    def test_refresh_stale_content(self):
+        processor = self.get_processor(cache_stale_ttl=60)
+        block = self.get_block()
+        cache_key = self.get_cache_key(processor, block)
+        cache.set(cache_key, ("<h2>Stale header</h2>", 0))
+
+        assert processor.render(block) == "<h2>Fresh header</h2>"
+        assert processor.parse_cache_entry(cache.get(cache_key)) == ("<h2>Fresh header</h2>", False)
+        assert cache_key + ":lock" not in cache
+
+    def test_serve_stale_content_while_locked(self):
+        processor = self.get_processor(cache_stale_ttl=60)
+        block = self.get_block()
+        cache_key = self.get_cache_key(processor, block)
+        cache.set(cache_key, ("<h2>Stale header</h2>", 0))
+
+        assert processor.acquire_cache_lock(cache_key) is True
+        assert processor.render(block) == "<h2>Stale header</h2>"
+
+    def test_bounded_wait_on_miss(self):
+        processor = self.get_processor(cache_lock=True, cache_lock_wait=0.1)
+        block = self.get_block()
+        cache_key = self.get_cache_key(processor, block)
+
+        assert processor.acquire_cache_lock(cache_key) is True
+        assert processor.render(block) == "<h2>Fresh header</h2>"
@@ -0,0 +1,84 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from blocks.models import HeaderBlock
+from django.core.cache import cache
+
+from streamfield import blocks, helpers, signals
+from streamfield.processors import DefaultProcessor
+
+
+@pytest.mark.django_db
+class TestCacheInvalidation:
+    stream = [{
+        "uuid": str(uuid4()),
+        "model": "blocks.headerblock",
+        "pk": "1"
+    }]
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        with patch.object(DefaultProcessor, "cache", True):
+            yield
+        cache.clear()
+
+    def test_stream_block_models_connected(self):
+        assert HeaderBlock in signals.connected_models
+
+    def test_save(self):
+        block = HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        assert helpers.render_stream(self.stream) == "<h1>Example header</h1>"
+
+        block.text = "Changed header"
+        block.save()
+        assert helpers.render_stream(self.stream) == "<h1>Changed header</h1>"
+
+    def test_delete(self):
+        block = HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        assert helpers.render_stream(self.stream) == "<h1>Example header</h1>"
+
+        block.delete()
+        assert helpers.render_stream(self.stream) == ""
+
+    def test_invalidation_on_commit(self, django_capture_on_commit_callbacks):
+        block = HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        processor = blocks.get_processor(HeaderBlock)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            block.text = "Changed header"
+            block.save()
+
+            # a concurrent request caches the old row under the new generation
+            cache.set(processor.get_versioned_cache_key(
+                processor.get_pk_cache_key(1),
+                processor.get_cache_generation()
+            ), "<h1>Example header</h1>")
+            assert helpers.render_stream(self.stream) == "<h1>Example header</h1>"
+
+        for callback in callbacks:
+            callback()
+        assert helpers.render_stream(self.stream) == "<h1>Changed header</h1>"
+
+    def test_queryset_update_is_not_tracked(self):
+        HeaderBlock.objects.create(
+            pk=1,
+            text="Example header"
+        )
+        assert helpers.render_stream(self.stream) == "<h1>Example header</h1>"
+
+        HeaderBlock.objects.filter(pk=1).update(text="Changed header")
+        assert helpers.render_stream(self.stream) == "<h1>Example header</h1>"
+
+        signals.invalidate_cache(HeaderBlock)
+        assert helpers.render_stream(self.stream) == "<h1>Changed header</h1>"
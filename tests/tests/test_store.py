@@ -0,0 +1,90 @@
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from blocks.models import HeaderBlock
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from streamfield import helpers
+from streamfield.middleware import BlockStoreMiddleware
+from streamfield.processors import DefaultProcessor
+from streamfield.store import block_store, get_current_store
+
+STREAM = [{
+    "uuid": str(uuid4()),
+    "model": "blocks.headerblock",
+    "pk": "1"
+}]
+
+
+class TestBlockStore:
+    def test_context_manager(self):
+        assert get_current_store() is None
+
+        with block_store() as store:
+            assert get_current_store() is store
+
+            with block_store() as nested_store:
+                assert nested_store is store
+
+            assert get_current_store() is store
+
+        assert get_current_store() is None
+
+
+@pytest.mark.django_db
+class TestSharedInstances:
+    def test_fetch_once(self, django_assert_num_queries):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+
+        with block_store():
+            with django_assert_num_queries(1):
+                assert helpers.render_stream(STREAM) == "<h1>Example header</h1>"
+                assert helpers.render_stream(STREAM, {"theme": "dark"}) == '<h1 class="header--dark">Example header</h1>'
+                assert helpers.render_block(STREAM[0]) == "<h1>Example header</h1>"
+
+    def test_caller_instances_are_not_shared(self):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+
+        with block_store() as store:
+            helpers.render_stream(STREAM)
+            shared_block = store.instances[HeaderBlock][1]
+
+            block = HeaderBlock(pk=1, text="Unsaved header")
+            assert helpers.render_blocks([block]) == ["<h1>Unsaved header</h1>"]
+            assert store.instances[HeaderBlock][1] is shared_block
+            assert helpers.render_stream(STREAM) == "<h1>Example header</h1>"
+
+        with block_store() as store:
+            helpers.render_blocks([block])
+            assert 1 not in store.instances[HeaderBlock]
+
+    def test_render_once(self):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+        cache.clear()
+
+        with patch.object(DefaultProcessor, "cache", True):
+            with block_store():
+                helpers.render_stream(STREAM)
+                with patch.object(cache, "get_many") as get_many:
+                    assert helpers.render_stream(STREAM) == "<h1>Example header</h1>"
+
+        get_many.assert_not_called()
+
+    def test_middleware(self, django_assert_num_queries):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+
+        def view(request):
+            assert get_current_store() is not None
+            return HttpResponse(
+                helpers.render_stream(STREAM) + helpers.render_stream(STREAM)
+            )
+
+        middleware = BlockStoreMiddleware(view)
+        with django_assert_num_queries(1):
+            response = middleware(RequestFactory().get("/"))
+
+        assert response.content == b"<h1>Example header</h1><h1>Example header</h1>"
+        assert get_current_store() is None
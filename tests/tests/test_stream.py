@@ -0,0 +1,98 @@
+import json
+import pickle
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from blocks.models import HeaderBlock, TextBlock
+
+from app.models import Page
+from streamfield import helpers
+from streamfield.stream import Stream, StreamBlock
+
+
+class TestStream:
+    def test_list_compatibility(self):
+        records = [{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1",
+            "visible": True
+        }]
+        stream = Stream(records)
+        assert stream == records
+        assert isinstance(stream[0], StreamBlock)
+        assert stream[0]["model"] == "blocks.headerblock"
+        assert json.loads(json.dumps(stream)) == records
+
+    def test_cached_model_and_pk(self):
+        block = StreamBlock(model="blocks.headerblock", pk="1")
+        with patch("django.apps.apps.get_model", return_value=HeaderBlock) as get_model:
+            assert block.model is HeaderBlock
+            assert block.pk == 1
+            assert block.model is HeaderBlock
+
+        get_model.assert_called_once_with("blocks.headerblock")
+
+    def test_reset_on_change(self):
+        block = StreamBlock(model="blocks.headerblock", pk="1")
+        assert block.pk == 1
+
+        block["pk"] = "2"
+        assert block.pk == 2
+
+        block.update(model="blocks.textblock")
+        assert block.model is TextBlock
+
+    @pytest.mark.parametrize("mutate", [
+        lambda block: (block.pop("model"), block.setdefault("model", "blocks.textblock")),
+        lambda block: (block.popitem(), block.popitem(), block.update(model="blocks.textblock")),
+        lambda block: (block.clear(), block.__setitem__("model", "blocks.textblock")),
+        lambda block: block.__ior__({"model": "blocks.textblock"}),
+    ])
+    def test_reset_on_mutation(self, mutate):
+        block = StreamBlock(model="blocks.headerblock", pk="1")
+        assert block.model is HeaderBlock
+
+        mutate(block)
+        assert block.model is TextBlock
+
+    def test_reset_on_pop(self):
+        block = StreamBlock(model="blocks.headerblock", pk="1")
+        assert block.pk == 1
+
+        block.pop("pk")
+        with pytest.raises(KeyError):
+            block.pk
+
+    def test_unknown_model(self):
+        block = StreamBlock(model="blocks.unknown", pk="1")
+        with pytest.raises(LookupError):
+            block.model
+
+    def test_pickle(self):
+        stream = Stream([{"uuid": str(uuid4()), "model": "blocks.headerblock", "pk": "1"}])
+        assert stream[0].pk == 1
+
+        restored = pickle.loads(pickle.dumps(stream))
+        assert restored == stream
+        assert isinstance(restored, Stream)
+        assert isinstance(restored[0], StreamBlock)
+        assert restored[0].pk == 1
+
+
+@pytest.mark.django_db
+class TestStreamField:
+    def test_from_db_value(self):
+        HeaderBlock.objects.create(pk=1, text="Example header")
+        Page.objects.create(pk=1, header="Page", slug="page", stream=[{
+            "uuid": str(uuid4()),
+            "model": "blocks.headerblock",
+            "pk": "1",
+            "visible": True
+        }])
+
+        page = Page.objects.get(pk=1)
+        assert isinstance(page.stream, Stream)
+        assert isinstance(page.stream[0], StreamBlock)
+        assert helpers.render_stream(page.stream) == "<h1>Example header</h1>"
@@ -1,21 +1,33 @@
 import pytest
-from blocks.models import HeaderBlock, TextBlock
+from blocks.models import ColumnBlock, HeaderBlock, TextBlock
+from django.core.cache import cache
 from django.template.backends.django import DjangoTemplates
 from jinja2 import Environment, FileSystemLoader
 
 from streamfield import conf
 from streamfield.templatetags.streamfield import (
     RenderBlockExtension,
+    RenderBlocksExtension,
+    RenderCachedStreamExtension,
     RenderStreamExtension,
+    RenderStreamsExtension,
 )
 
+STREAM = [{"uuid": "1234-5678", "model": "blocks.headerblock", "pk": "1"}]
+
 
 @pytest.mark.django_db
 class TestJinja2:
     def setup_method(self):
         self.env = Environment(
             loader=FileSystemLoader("tests/blocks/jinja2"),
-            extensions=[RenderStreamExtension, RenderBlockExtension],
+            extensions=[
+                RenderStreamExtension,
+                RenderCachedStreamExtension,
+                RenderStreamsExtension,
+                RenderBlockExtension,
+                RenderBlocksExtension,
+            ],
             autoescape=True
         )
 
@@ -55,6 +67,76 @@ class TestJinja2:
                "<h2 class=\"header--new-year\">Happy New Year</h2>"
                "</div>")
 
+    def test_render_blocks(self):
+        header_block = HeaderBlock.objects.create(
+            pk=1,
+            rank=2,
+            text="Happy New Year"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+        template = self.env.from_string(
+            "{% render_blocks items as rendered %}"
+            "{% for html in rendered %}<div>{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "items": [header_block, ("blocks.textblock", 1)]
+        }) == ("<div><h2>Happy New Year</h2></div>"
+               "<div><div><p>Example text</p></div></div>")
+
+
+    def test_render_streams(self):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        TextBlock.objects.create(pk=1, text="Example text")
+
+        template = self.env.from_string(
+            "{% render_streams streams as rendered %}"
+            "{% for html in rendered %}<div>{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "streams": [
+                STREAM,
+                [{"uuid": "1234-5679", "model": "blocks.textblock", "pk": "1"}]
+            ]
+        }) == ("<div><h1>First header</h1></div>"
+               "<div><div><p>Example text</p></div></div>")
+
+    def test_render_object_streams(self):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        ColumnBlock.objects.create(pk=1, stream=STREAM)
+
+        template = self.env.from_string(
+            "{% render_streams columns, \"stream\" as rendered %}"
+            "{% for column, html in rendered %}<div id=\"{{ column.pk }}\">{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "columns": ColumnBlock.objects.all()
+        }) == "<div id=\"1\"><h1>First header</h1></div>"
+
+    def test_render_cached_stream(self):
+        header_block = HeaderBlock.objects.create(pk=1, text="Old header")
+        template = self.env.from_string("<div>{% render_cached_stream stream, \"theme\" %}</div>")
+
+        cache.clear()
+        try:
+            assert template.render({
+                "theme": "dark",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--dark\">Old header</h1></div>"
+
+            HeaderBlock.objects.filter(pk=header_block.pk).update(text="New header")
+            assert template.render({
+                "theme": "dark",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--dark\">Old header</h1></div>"
+            assert template.render({
+                "theme": "light",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--light\">New header</h1></div>"
+        finally:
+            cache.clear()
 
 @pytest.mark.django_db
 class TestDjango:
@@ -115,3 +197,84 @@ class TestDjango:
                "</div>")
 
         conf.DEFAULT_TEMPLATE_ENGINE = None
+
+    def test_render_blocks(self):
+        header_block = HeaderBlock.objects.create(
+            pk=1,
+            rank=2,
+            text="Happy New Year"
+        )
+        TextBlock.objects.create(
+            pk=1,
+            text="Example text"
+        )
+
+        assert conf.DEFAULT_TEMPLATE_ENGINE is None
+        conf.DEFAULT_TEMPLATE_ENGINE = "django"
+
+        template = self.env.from_string(
+            "{% load streamfield %}"
+            "{% render_blocks items as rendered %}"
+            "{% for html in rendered %}<div>{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "items": [header_block, ("blocks.textblock", 1)]
+        }) == ("<div><h2>Happy New Year</h2></div>"
+               "<div><div><p>Example text</p></div></div>")
+
+        conf.DEFAULT_TEMPLATE_ENGINE = None
+
+    def test_render_streams(self):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        TextBlock.objects.create(pk=1, text="Example text")
+
+        template = self.env.from_string(
+            "{% load streamfield %}"
+            "{% render_streams streams as rendered %}"
+            "{% for html in rendered %}<div>{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "streams": [
+                STREAM,
+                [{"uuid": "1234-5679", "model": "blocks.textblock", "pk": "1"}]
+            ]
+        }) == ("<div><h1>First header</h1></div>"
+               "<div><div><p>Example text</p></div></div>")
+
+    def test_render_object_streams(self):
+        HeaderBlock.objects.create(pk=1, text="First header")
+        ColumnBlock.objects.create(pk=1, stream=STREAM)
+
+        template = self.env.from_string(
+            "{% load streamfield %}"
+            "{% render_streams columns \"stream\" as rendered %}"
+            "{% for column, html in rendered %}<div id=\"{{ column.pk }}\">{{ html }}</div>{% endfor %}"
+        )
+        assert template.render({
+            "columns": ColumnBlock.objects.all()
+        }) == "<div id=\"1\"><h1>First header</h1></div>"
+
+    def test_render_cached_stream(self):
+        header_block = HeaderBlock.objects.create(pk=1, text="Old header")
+        template = self.env.from_string(
+            "{% load streamfield %}<div>{% render_cached_stream stream \"theme\" %}</div>"
+        )
+
+        cache.clear()
+        try:
+            assert template.render({
+                "theme": "dark",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--dark\">Old header</h1></div>"
+
+            HeaderBlock.objects.filter(pk=header_block.pk).update(text="New header")
+            assert template.render({
+                "theme": "dark",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--dark\">Old header</h1></div>"
+            assert template.render({
+                "theme": "light",
+                "stream": STREAM
+            }) == "<div><h1 class=\"header--light\">New header</h1></div>"
+        finally:
+            cache.clear()